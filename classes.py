@@ -1,22 +1,155 @@
 import random
-from typing import List, Dict, Union
+import numpy as np
+from typing import List, Tuple, Dict, Union
+
+class Adjacency:
+	'''
+	Compressed (CSR) adjacency of a graph, built from its list of edges.
+
+	Attributes:
+		nodes (np.ndarray): Sorted unique node ids. The position of a node is its index.
+		offsets (np.ndarray): Neighbors of nodes[i] are stored at offsets[i]:offsets[i + 1].
+		neighbor_index (np.ndarray): Index of each neighbor.
+		neighbor_ids (np.ndarray): Node id of each neighbor.
+	'''
+	def __init__(self, edges: Union[List[Tuple[int, int]], np.ndarray]) -> None:
+		edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+		#Map node ids to indices 0..N-1
+		self.nodes, pairs = np.unique(edges, return_inverse=True)
+		pairs = pairs.reshape(-1, 2)
+		number_of_nodes = len(self.nodes)
+
+		#Store each edge in both directions, drop self-loops and duplicates (sorted by source)
+		pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+		keys = np.unique(np.concatenate([pairs[:, 0] * number_of_nodes + pairs[:, 1],
+										 pairs[:, 1] * number_of_nodes + pairs[:, 0]]))
+		sources = keys // number_of_nodes
+		self.neighbor_index = keys % number_of_nodes
+
+		self.offsets = np.zeros(number_of_nodes + 1, dtype=np.int64)
+		np.cumsum(np.bincount(sources, minlength=number_of_nodes), out=self.offsets[1:])
+
+		#Node ids equal indices for generated graphs, so both arrays can be shared
+		self.contiguous = number_of_nodes == 0 or (self.nodes[0] == 0 and self.nodes[-1] == number_of_nodes - 1)
+		self.neighbor_ids = self.neighbor_index if self.contiguous else self.nodes[self.neighbor_index]
+
+	@classmethod
+	def from_arrays(cls, nodes: np.ndarray, offsets: np.ndarray, neighbor_index: np.ndarray) -> 'Adjacency':
+		'''
+		Create adjacency from existing CSR arrays (e.g. shared memory) without copying.
+		'''
+		adjacency = cls.__new__(cls)
+		adjacency.nodes = nodes
+		adjacency.offsets = offsets
+		adjacency.neighbor_index = neighbor_index
+		adjacency.contiguous = len(nodes) == 0 or (nodes[0] == 0 and nodes[-1] == len(nodes) - 1)
+		adjacency.neighbor_ids = neighbor_index if adjacency.contiguous else nodes[neighbor_index]
+		return adjacency
+
+	def __len__(self) -> int:
+		return len(self.nodes)
+
+	def __contains__(self, node: int) -> bool:
+		try:
+			self.index_of(node)
+			return True
+		except KeyError:
+			return False
+
+	def __getitem__(self, node: int) -> np.ndarray:
+		'''
+		Return neighbor ids of node as a zero-copy slice.
+		'''
+		index = self.index_of(node)
+		return self.neighbor_ids[self.offsets[index]:self.offsets[index + 1]]
+
+	def index_of(self, node: int) -> int:
+		'''
+		Return index of node id.
+		'''
+		if self.contiguous:
+			if 0 <= node < len(self.nodes):
+				return int(node)
+			raise KeyError(node)
+
+		index = int(np.searchsorted(self.nodes, node))
+		if index == len(self.nodes) or self.nodes[index] != node:
+			raise KeyError(node)
+		return index
+
+	def indices_of(self, nodes: Union[List[int], np.ndarray]) -> np.ndarray:
+		'''
+		Return index of each node id (index_of for many nodes at once).
+		'''
+		nodes = np.asarray(nodes, dtype=np.int64)
+		indices = nodes if self.contiguous else np.searchsorted(self.nodes, nodes)
+		found = (indices >= 0) & (indices < len(self.nodes))
+		found[found] = self.nodes[indices[found]] == nodes[found]
+		if not found.all():
+			raise KeyError(int(nodes[~found][0]))
+		return indices
+
+	def neighbors_of_index(self, index: int) -> np.ndarray:
+		'''
+		Return neighbor indices of the node at index as a zero-copy slice.
+		'''
+		return self.neighbor_index[self.offsets[index]:self.offsets[index + 1]]
+
+	def neighbor_pairs(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+		'''
+		Return (source, neighbor) index pairs for all neighbors of the nodes
+		at indices, gathered without a Python loop.
+
+		returns: sources, targets
+		'''
+		indices = np.asarray(indices, dtype=np.int64)
+		starts = self.offsets[indices]
+		counts = self.offsets[indices + 1] - starts
+
+		#Position of each pair within the neighbor array
+		ends = np.cumsum(counts)
+		positions = np.arange(ends[-1] if len(ends) else 0, dtype=np.int64) + np.repeat(starts - (ends - counts), counts)
+
+		return np.repeat(indices, counts), self.neighbor_index[positions]
+
+	def degree(self) -> np.ndarray:
+		'''
+		Return number of neighbors of each node.
+		'''
+		return np.diff(self.offsets)
+
+	def sources(self) -> np.ndarray:
+		'''
+		Return source index of each stored (directed) neighbor pair.
+		'''
+		return np.repeat(np.arange(len(self.nodes), dtype=np.int64), self.degree())
 
 class Landpatch:
 	'''
 	Represents a land patch in a graph.
 
+	Patches are slotted (no per-patch __dict__) and all subclasses share
+	the slots of Landpatch, so a patch changes between Treepatch and
+	Rockpatch in place by switching its class: the object in land_patches,
+	and every reference to it, stays the same.
+
 	Attributes:
 		id (int): Unique identifier for the land patch.
-		neighbors (List[int]): List of neighbor patch IDs.
+		neighbors (np.ndarray): Neighbor patch IDs (slice of the graph Adjacency).
 		fire (bool): Whether the patch is on fire.
+		treestats (int): Tree health and color (only set on tree patches and
+			patches that were trees).
 
 	'''
-	def __init__(self, id: int, neighbors: List[int], fire: bool = False) -> None:
+	__slots__ = ('id', 'neighbors', 'fire', 'treestats')
+
+	def __init__(self, id: int, neighbors: np.ndarray, fire: bool = False) -> None:
 		self.id = id
 		self.neighbors = neighbors
 		self.fire = fire
 
-	def get_neighbors(self) -> List[int]:
+	def get_neighbors(self) -> np.ndarray:
 		''' 
 		Returns list of neighbors
 		'''
@@ -32,22 +165,32 @@ class Rockpatch(Landpatch):
 	Attributes:
 	id (int): Unique identifier for the rock patch.
 	'''
+	__slots__ = ()
+
 	def __init__(self, id, neighbors, fire) -> None:
 		super().__init__(id, neighbors, fire)
 
 	def mutate(self, land_patches: Dict[int, Union['Treepatch', 'Landpatch']],
-			probabilities: Dict[str, float], cmap: Dict[int, int]) -> None:
+			probabilities: Dict[str, float], cmap: Dict[int, int], rng: random.Random = random) -> None:
 		'''
-		Swap a Rockpatch with a Treepatch without loosing connection to
-		neighbors and associations with firefighters.
+		Turn the Rockpatch into a Treepatch (in place) with the respawn
+		probability, without loosing connection to neighbors and
+		associations with firefighters.
 		'''
-		if random.uniform(0.0, 1.0) < probabilities['respawn']:
-			#Create Treepatch with same id in landpatches
-			land_patches[self.id] = Treepatch(id = self.id, treestats=random.randint(0, 256),
-									  neighbors = self.neighbors, fire = False)
-			
-			#Add to cmap
-			cmap[self.id] = land_patches[self.id].treestats
+		if rng.uniform(0.0, 1.0) < probabilities['respawn']:
+			self.respawn(land_patches, cmap, rng)
+
+	def respawn(self, land_patches: Dict[int, Union['Treepatch', 'Landpatch']], cmap: Dict[int, int],
+			rng: random.Random = random) -> None:
+		'''
+		Unconditionally turn the Rockpatch into a Treepatch of random health (in place).
+		'''
+		self.__class__ = Treepatch
+		self.treestats = rng.randint(0, 256)
+		self.fire = False
+		
+		#Add to cmap
+		cmap[self.id] = self.treestats
 		
 	def __repr__(self):
 		return f"Rockpatch{self.id}"
@@ -61,6 +204,7 @@ class Treepatch(Landpatch):
 	treestats (int): Tree health and color
 	fire (bool): Boolean indicating whether treepatch is on fire
 	'''
+	__slots__ = ()
 
 	def __init__(self, id, neighbors, fire = False, treestats = None) -> None:
 		
@@ -72,55 +216,75 @@ class Treepatch(Landpatch):
 
 	def mutate(self, land_patches: Dict[int, Union['Treepatch', Landpatch]], cmap: Dict[int, int]):
 		'''
-		Swap a Treepatch with a Rockpatch without loosing connection to
-		neighbors and associations with firefighters
+		Turn the Treepatch into a Rockpatch (in place) without loosing
+		connection to neighbors and associations with firefighters
 		'''
-		#Create Rockpatch with same id in landpatches
-		land_patches[self.id] = Rockpatch(id = self.id, fire = False, neighbors = self.neighbors)
+		self.__class__ = Rockpatch
+		self.fire = False
 		
 		#Remove from cmap
 		del cmap[self.id]
 	
-	def updateland(self, firefighters: Dict[int, 'Firefighter'], land_patches: Dict[int, Union['Treepatch', 'Landpatch']], cmap: Dict[int, int]) -> None:
+	def updateland(self, occupancy: Dict[int, List['Firefighter']], land_patches: Dict[int, Union['Treepatch', 'Landpatch']], cmap: Dict[int, int]) -> None:
 		'''
 		Update value of treestats due to fire or firefighter action
-		for each step of iteration
+		for each step of iteration. Occupancy maps patch ids to the
+		firefighters present there; their skills stack.
 		'''
+		firefighters_present = occupancy.get(self.id)
+
 		#If on fire and no firefighter, damage by 20 units
-		if self.fire is True and self.id not in firefighters.values():
+		if self.fire is True and not firefighters_present:
 			self.treestats -= 20
 			if self.treestats <= -256:
 				self.fire = False
 				self.mutate(land_patches, cmap)
 
-		#If on fire and firefighter present, heal according to skill and put out fire
-		elif self.fire is True and self.id in firefighters.values():
-			firefighter = [firefighter for firefighter in firefighters if firefighter.position == self.id][0]
-			self.treestats += 25 + int(firefighter.skill)
+		#If on fire and firefighters present, heal according to their combined skill and put out fire
+		elif self.fire is True:
+			self.treestats += 25 + sum(int(firefighter.skill) for firefighter in firefighters_present)
 			if self.treestats >= 0:
 				self.fire = False
 				self.treestats = 256
 
 		#If no fire and no firefighter, heal by 10 units
-		elif self.fire is False and self.id not in firefighters.values():
+		elif not firefighters_present:
 			self.treestats += 10			
 
 	def __repr__(self):
 		return f"Treepatch{self.id}"
 	
-	def combustion(self, probabilities: Dict[str, float]) -> None:
-		if random.uniform(0.0, 1.0) < probabilities['combustion']:
-			self.fire = True
-			self.treestats = 0
+	def combustion(self, probabilities: Dict[str, float], rng: random.Random = random) -> None:
+		if rng.uniform(0.0, 1.0) < probabilities['combustion']:
+			self.ignite()
+
+	def ignite(self) -> None:
+		'''
+		Unconditionally set the Treepatch on fire.
+		'''
+		self.fire = True
+		self.treestats = 0
 
 	def transmission(self,
-				probabilities: Dict[str, float]
-				) -> None:
+				probabilities: Dict[str, float],
+				land_patches: Dict[int, Union['Treepatch', Landpatch]],
+				rng: random.Random = random
+				) -> int:
+		'''
+		Spread fire to neighboring Treepatches.
+
+		returns: number of neighbors that were not on fire before
+		'''
+		ignited = 0
 		if self.fire is True:
 			for neighbor in self.neighbors:
-				if isinstance(neighbor, Treepatch) and random.uniform(0, 1) < probabilities['transmission']:
+				neighbor = land_patches[neighbor]
+				if isinstance(neighbor, Treepatch) and rng.uniform(0, 1) < probabilities['transmission']:
+					if neighbor.fire is False:
+						ignited += 1
 					neighbor.fire = True
 					neighbor.treestats = 0
+		return ignited
 			
 		
 class Firefighter:
@@ -132,6 +296,7 @@ class Firefighter:
 	position: Current position of the firefighter in graph (patch id)
 
 	'''
+	__slots__ = ('skill', 'position', 'id')
 
 	instance_count = 0
 
@@ -147,7 +312,7 @@ class Firefighter:
 	def __repr__(self):
 		return f"Firefighter{self.id}"
 
-	def movement(self, land_patches: Dict[int, Union[Treepatch, Landpatch]]) -> None:
+	def movement(self, land_patches: Dict[int, Union[Treepatch, Landpatch]], rng: random.Random = random) -> None:
 		'''
 		Initiate firefighter movement toward fire. 
 		'''
@@ -164,9 +329,9 @@ class Firefighter:
 		
 		#If one or more neighbor treepatch on fire, move randomly there. 
 		if neighbors_on_fire:
-			self.position = random.choice(neighbors_on_fire)
+			self.position = int(rng.choice(neighbors_on_fire))
 		#If no neighbors on fire, move to random neighbor
 		else:
-			self.position = random.choice(neighbors)
+			self.position = int(rng.choice(neighbors))
 
 
@@ -11,6 +11,7 @@ Course: Introduction to Programming (SDU, 2023)
 import module_user_input as user_input
 import module_configuration as configuration
 import module_simulation as simulation
+import module_random
 import module_reporting as reporting
 import visualiser_random_forest_graph as vr
 
@@ -18,20 +19,24 @@ def menu_main() -> None:
 	""" Create main menu of the program in which users can select 
 	to read the graph data from a file or random generation"""
 
+	#One random number context for graph, landscape, firefighters and simulation
+	rng = module_random.RandomContext()
+
 	while True:
 		try:
 			user_option = input("Enter your choice (default = Randomly generated): ").strip()
 
 			if user_option == "":
-				edges, pos = configuration.generate_random_graph()
+				edges, pos = configuration.generate_random_graph(rng=rng.generator)
 
 			option = int(user_option)
 
 			if option == 1: #Load
 				edges = configuration.read_from_file()
+				pos = None
 
 			elif option == 2: #Random
-				edges, pos = configuration.generate_random_graph()
+				edges, pos = configuration.generate_random_graph(rng=rng.generator)
 				
 			elif option == 9: #Exit
 				print('Bye')
@@ -55,27 +60,33 @@ def menu_main() -> None:
 		#Iterations
 		number_of_iterations = user_input.number_of_iterations()
 
+		#Simulation engine (object based or vectorized)
+		engine = user_input.engine()
+
 		#Create initial color map
-		cmap = configuration.create_color_map(nodes, fraction_tree)
+		cmap = configuration.create_color_map(nodes, fraction_tree, rng.random)
 		
+		#Create compressed adjacency of the graph
+		adjacency = configuration.create_adjacency(edges)
+
 		#Assign nodes to appropriate classes
-		land_patches = configuration.create_land_patches(cmap, nodes, edges)
+		land_patches = configuration.create_land_patches(cmap, nodes, edges, adjacency)
 
 		#Initialize firefighters
-		firefighters = configuration.create_firefighters(nodes)
+		firefighters = configuration.create_firefighters(nodes, rng=rng.random)
 		
 		#Initialize graph
 		if pos is not None:
-			graph = vr.Visualiser(edges, pos_nodes=pos, vis_labels=True)
+			graph = vr.Visualiser(edges, pos_nodes=pos, vis_labels=True, reuse_artists=True, fps=10)
 		else:
-			graph = vr.Visualiser(edges, vis_labels=True)
+			graph = vr.Visualiser(edges, vis_labels=True, reuse_artists=True, fps=10)
 
 		graph.update_node_colours(cmap)
 		graph.update_node_edges([firefighter.position for firefighter in firefighters.keys()])
 		
 		#Run simulation (and store history lists)
 		fire_history, tree_history, rock_history = simulation.visualization(
-			graph, edges, probabilities, firefighters, land_patches, cmap, number_of_iterations)
+			graph, edges, probabilities, firefighters, land_patches, cmap, number_of_iterations, engine, adjacency, rng)
 
 		#Create static graph with simulation results
 		reporting.static_graph(number_of_iterations,
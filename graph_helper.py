@@ -1,6 +1,7 @@
 """
 This module provides a set of helper functions, to:
 voronoi_to_edges: generate collection of edges defining a planar graph.
+voronoi_graph: same as voronoi_to_edges with NumPy arrays as output, scaling to large graphs
 edges_planar: verifies if the given set of edges defines a planar graph
 
 Written by Antonia Rago
@@ -40,45 +41,81 @@ def voronoi_to_edges(minpoints:int,npoints:Optional[int]=0)->Tuple[List[Tuple[in
    coord_map: Dict[int:(float,float)]
       Dictionary containing the coordinate of each vertex (expressed as a tuple of float in [0,1]x[0,1])
   '''
+  edges,positions=voronoi_graph(minpoints,npoints)
+  return [tuple(edge) for edge in edges.tolist()],dict(enumerate(map(tuple,positions.tolist())))
+
+def voronoi_graph(minpoints:int,npoints:Optional[int]=0,seed:Optional[int]=None,
+                  rng:Optional[np.random.Generator]=None)->Tuple[np.ndarray,np.ndarray]:
+  '''
+   Generates a random planar graph containing at least minpoints (based on the Voronoi graph),
+   without recursion: if a diagram has too few vertices, the number of points is scaled by the
+   observed number of vertices per point and the diagram is generated once more.
+
+   Parameters:
+   ----------
+   minpoints: Minimal number of points requested for the graph
+   npoints: Number of points in the (first) Voronoi graph generation, minpoints if smaller than 4
+   seed: Seed for a new random number generator
+   rng: Random number generator to use (numpy.random global state if neither seed nor rng is given)
+
+   Return: Tuple[edges,positions]
+   ----------
+   edges: np.ndarray
+      Array of shape (edges,2) with the vertices of each edge
+   positions: np.ndarray
+      Array of shape (vertices,2) with the coordinate of each vertex in [0,1]x[0,1]
+  '''
   if(minpoints<4):
-     raise Exception("voronoi_to_edges, the number of points must be larger than 3")
+     raise Exception("voronoi_graph, the number of points must be larger than 3")
   if(npoints<4):
      npoints=minpoints
-  points=np.random.rand(npoints,2)
-# we get the voronoi diagram
-  vor = Voronoi(points)
-# storage variable
-  res=[]
-  map={}
-  jj=0
-# Add an edge for each ridge in the Voronoi diagram that connects two points in the range [0,1] 
-  for simplex in vor.ridge_vertices:
-      if -1 not in simplex:
-          i, j = simplex
-          p = vor.vertices[i]
-          q = vor.vertices[j]
-          if 0 <= p[0] <= 1 and 0 <= p[1] <= 1 and 0 <= q[0] <= 1 and 0 <= q[1] <= 1:
-              if tuple(p) not in map:
-                 map[tuple(p)]=jj
-                 jj+=1
-              if tuple(q) not in map:
-                 map[tuple(q)]=jj
-                 jj+=1
-              res.append((tuple(p), tuple(q)))
-  if len(map) < minpoints:
-   return voronoi_to_edges(minpoints, npoints+1)
-  else:
-   return [(map[i[0]],map[i[1]]) for i in res],{v: k for k, v in map.items()}
-  
+  if(rng is None and seed is not None):
+     rng=np.random.default_rng(seed)
+  random=np.random.random if rng is None else rng.random
+  while True:
+    edges,positions=_voronoi_edges(Voronoi(random((npoints,2))))
+    if len(positions)>=minpoints:
+      return edges,positions
+    npoints=max(npoints+1,int(np.ceil(1.05*npoints*minpoints/max(len(positions),1))))
+
+def _voronoi_edges(vor:Voronoi)->Tuple[np.ndarray,np.ndarray]:
+  '''
+   Edges for the ridges of a Voronoi diagram that connect two vertices in [0,1]x[0,1]. Vertices
+   with equal coordinates are merged and numbered in order of first appearance in the ridges.
+  '''
+  vertices=vor.vertices
+  inside=np.all((vertices>=0)&(vertices<=1),axis=1)
+  ridges=np.asarray(vor.ridge_vertices,dtype=np.int64).reshape(-1,2)
+  ridges=ridges[np.all(ridges>=0,axis=1)]
+  ridges=ridges[np.all(inside[ridges],axis=1)]
+# unique vertices of the ridges, then unique coordinates of those vertices
+  sequence=ridges.reshape(-1)
+  used,first,inverse=np.unique(sequence,return_index=True,return_inverse=True)
+  points=vertices[used]
+  by_coordinates=np.lexsort((points[:,1],points[:,0]))
+  points=points[by_coordinates]
+  starts=np.ones(len(points),dtype=bool)
+  starts[1:]=np.any(points[1:]!=points[:-1],axis=1)
+  coordinates=points[starts]
+  group=np.empty(len(points),dtype=np.int64)
+  group[by_coordinates]=np.cumsum(starts)-1
+  group_first=np.minimum.reduceat(first[by_coordinates],np.flatnonzero(starts)) if len(points) else first
+# number coordinates by first appearance
+  order=np.argsort(group_first,kind='stable')
+  ids=np.empty(len(order),dtype=np.int64)
+  ids[order]=np.arange(len(order))
+  return ids[group[inverse.reshape(-1)]].reshape(-1,2),coordinates[order]
 
 def edges_planar(edges=List[Tuple[int,int]])-> bool:
   '''  Verifies if the graph defined by the edges is planar
   Parameters:
    ----------
   edges: List[(int,int)]
-      List containing the edges (Tuples of 2 vertices) forming the graph.
+      List containing the edges (Tuples of 2 vertices) forming the graph, or an array of shape (edges, 2).
 
   Return: Bool
 
     '''
+  if isinstance(edges,np.ndarray):
+    edges = edges.tolist()
   return nx.is_planar(nx.Graph(edges))
\ No newline at end of file
@@ -0,0 +1,248 @@
+"""
+module_animation.py
+
+Offline animation export for the Fire Simulation project.
+A headless run records the color map and firefighter positions of every
+drawn iteration (FrameRecorder stands in for the Visualiser). The frames
+are then rendered with the Agg backend across a process pool, using the
+same drawing as the Visualiser, into numbered PNGs and optionally
+encoded into an MP4 (when ffmpeg is installed) or a GIF.
+
+Usage:
+	python module_animation.py --iterations 2000 --seed 1 --frames-dir frames --video run.mp4
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import module_batch as batch
+import module_configuration as configuration
+import module_checkpoint as checkpoint
+import module_layout as layout
+import module_simulation as simulation
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any, Iterator, Optional
+
+#Recorded color value of patches without color (rock patches)
+NO_COLOUR = np.iinfo(np.int16).min
+
+#Visualiser of the current worker process (set by _init_renderer)
+_renderer: Dict[str, Any] = {}
+
+class FrameRecorder:
+	'''
+	Records the state drawn on each frame, with the interface of the
+	Visualiser used by module_simulation, so runs can be recorded without
+	creating any figure.
+
+	Attributes:
+		nodes (np.ndarray): Sorted node ids; column order of the recorded colours.
+		positions (np.ndarray): Node positions in nodes order.
+		colours (List[np.ndarray]): Colour value per node for each frame (NO_COLOUR for rocks).
+		labels (List[np.ndarray]): Firefighter positions (node ids) for each frame.
+	'''
+	def __init__(self, edges: List[Tuple[int, int]], pos: Optional[Dict[int, Tuple[float, float]]] = None) -> None:
+		self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+		self.nodes = np.unique(self.edges)
+		self._node_index = {int(node): i for i, node in enumerate(self.nodes)}
+
+		#Use the (cached) layout of the Visualiser if the graph has no positions (e.g. loaded from file)
+		if not pos:
+			pos = layout.cached_layout(self.edges)
+		self.positions = np.array([pos[int(node)] for node in self.nodes], dtype=np.float64)
+
+		self.colours = []
+		self.labels = []
+
+	def is_open(self) -> bool:
+		return True
+
+	def close(self) -> None:
+		pass
+
+	def update(self, Colour_map: Dict[int, int], lab_map: List[int]) -> None:
+		'''
+		Record colours and firefighter positions of one frame.
+		'''
+		colours = np.full(len(self.nodes), NO_COLOUR, dtype=np.int16)
+		if Colour_map:
+			index = np.fromiter((self._node_index[key] for key in Colour_map.keys()), dtype=np.int64, count=len(Colour_map))
+			values = np.fromiter(Colour_map.values(), dtype=np.int64, count=len(Colour_map))
+			colours[index] = np.clip(values, -256, 256)
+		self.colours.append(colours)
+		self.labels.append(np.asarray(lab_map, dtype=np.int64))
+
+	def save(self, path: str) -> None:
+		'''
+		Save recording to an .npz file.
+		'''
+		counts = np.array([len(labels) for labels in self.labels], dtype=np.int64)
+		np.savez_compressed(path,
+							edges=self.edges,
+							nodes=self.nodes,
+							positions=self.positions,
+							colours=np.stack(self.colours) if self.colours else np.empty((0, len(self.nodes)), dtype=np.int16),
+							labels=np.concatenate(self.labels) if self.labels else np.empty(0, dtype=np.int64),
+							label_offsets=np.concatenate([[0], np.cumsum(counts)]))
+
+def load_recording(path: str) -> Dict[str, np.ndarray]:
+	'''
+	Load recording saved by FrameRecorder.save.
+
+	returns: dictionary of arrays
+	'''
+	with np.load(path) as recording:
+		return {key: recording[key] for key in recording.files}
+
+def _init_renderer(recording_path: str) -> None:
+	'''
+	Create one off-screen Visualiser per worker process.
+	'''
+	import matplotlib
+	matplotlib.use('Agg')
+	import visualiser_random_forest_graph as vr
+
+	recording = load_recording(recording_path)
+	pos = {int(node): tuple(position) for node, position in zip(recording['nodes'], recording['positions'])}
+	_renderer['recording'] = recording
+	_renderer['graph'] = vr.Visualiser([tuple(edge) for edge in recording['edges'].tolist()], pos_nodes=pos,
+									   reuse_artists=True, pause=0)
+
+def _render_frames(frames: Tuple[int, int, str]) -> int:
+	'''
+	Render frames start..stop-1 of the recording to numbered PNGs in directory.
+
+	returns: number of frames rendered
+	'''
+	from PIL import Image
+
+	start, stop, directory = frames
+	recording = _renderer['recording']
+	graph = _renderer['graph']
+	nodes = recording['nodes'].tolist()
+
+	for frame in range(start, stop):
+		colours = recording['colours'][frame]
+		Colour_map = {nodes[i]: int(colours[i]) for i in np.flatnonzero(colours != NO_COLOUR)}
+		labels = recording['labels'][recording['label_offsets'][frame]:recording['label_offsets'][frame + 1]].tolist()
+		graph.update(Colour_map, labels)
+
+		#The canvas holds the blitted nodes, which savefig would leave out
+		Image.fromarray(graph.frame()).save(frame_path(directory, frame))
+
+	return stop - start
+
+def frame_path(directory: str, frame: int) -> str:
+	'''
+	Return path of the numbered PNG of frame.
+	'''
+	return os.path.join(directory, f"frame_{frame:05d}.png")
+
+def render_recording(recording_path: str, directory: str, workers: Optional[int] = None) -> int:
+	'''
+	Render all frames of a recording to numbered PNGs in directory,
+	split into contiguous chunks across a process pool. Frames left in
+	directory by an earlier recording are deleted first.
+
+	returns: number of frames rendered
+	'''
+	number_of_frames = len(load_recording(recording_path)['colours'])
+	if workers is None:
+		workers = os.cpu_count() or 1
+	os.makedirs(directory, exist_ok=True)
+	for name in os.listdir(directory):
+		if name.startswith('frame_') and name.endswith('.png'):
+			os.remove(os.path.join(directory, name))
+
+	bounds = np.linspace(0, number_of_frames, min(workers*4, number_of_frames) + 1).astype(int)
+	chunks = [(int(start), int(stop), directory) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+	with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer, initargs=(recording_path,)) as executor:
+		return sum(executor.map(_render_frames, chunks))
+
+def _read_frames(paths: List[str]) -> Iterator[Any]:
+	'''
+	Yield the images of paths one at a time, closing each file after reading it.
+	'''
+	from PIL import Image
+	for path in paths:
+		with Image.open(path) as image:
+			yield image.copy()
+
+def encode(directory: str, output: str, fps: float = 10, number_of_frames: Optional[int] = None) -> None:
+	'''
+	Encode the first number_of_frames numbered PNGs in directory (default:
+	all consecutive frames from frame 0) into an MP4 (requires ffmpeg) or GIF.
+	'''
+	if number_of_frames is None:
+		number_of_frames = 0
+		while os.path.exists(frame_path(directory, number_of_frames)):
+			number_of_frames += 1
+	if number_of_frames == 0:
+		raise ValueError(f"No frames to encode in '{directory}'")
+
+	if output.endswith('.gif'):
+		frames = _read_frames([frame_path(directory, frame) for frame in range(number_of_frames)])
+		next(frames).save(output, save_all=True, append_images=frames, duration=int(1000/fps), loop=0)
+		return
+
+	ffmpeg = shutil.which('ffmpeg')
+	if ffmpeg is None:
+		raise RuntimeError("ffmpeg was not found, encode to .gif or use the PNG frames instead")
+	subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+					'-i', os.path.join(directory, 'frame_%05d.png'), '-frames:v', str(number_of_frames),
+					'-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output], check=True)
+
+def record(config: Dict[str, Any], render_every: int = 1) -> FrameRecorder:
+	'''
+	Run the simulation headless from config, recording every render_every iterations.
+
+	returns: FrameRecorder
+	'''
+	state = batch.setup(config)
+	config = state['config']
+	recorder = FrameRecorder(state['edges'], state['pos'])
+	checkpoints = None
+	if config['checkpoint'] is not None:
+		checkpoints = checkpoint.CheckpointWriter(config['checkpoint'], state, config['checkpoint_every'])
+
+	simulation.visualization(recorder, state['edges'], config['probabilities'], state['firefighters'],
+							 state['land_patches'], state['cmap'], config['iterations'], config['engine'],
+							 state['adjacency'], state['rng'], render_every, checkpoints=checkpoints,
+							 dispatch=config['dispatch'])
+
+	return recorder
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Record a run from command line arguments, render its frames and encode them.
+	'''
+	parser = batch.make_parser("Record a headless run of the fire simulation and render it as an animation.")
+	parser.add_argument('--render-every', dest='render_every', type=int, default=1, help="Record every k iterations")
+	parser.add_argument('--frames-dir', dest='frames_dir', default='frames', help="Directory for the numbered PNGs")
+	parser.add_argument('--video', help="MP4 or GIF file to encode the frames into")
+	parser.add_argument('--video-fps', dest='video_fps', type=float, default=10, help="Frame rate of the video")
+	parser.add_argument('--workers', type=int, help="Number of render processes (default: number of cores)")
+	parser.set_defaults(output='recording.npz')
+
+	arguments = parser.parse_args(argv)
+	if arguments.render_every < 1:
+		parser.error("--render-every must be at least 1")
+	config = batch.parse_arguments(argv, parser)
+	for key in ('render_every', 'frames_dir', 'video', 'video_fps', 'workers'):
+		config.pop(key, None)
+
+	recorder = record(config, arguments.render_every)
+	configuration.wait_for_planarity()
+	recorder.save(config['output'])
+	number_of_frames = render_recording(config['output'], arguments.frames_dir, arguments.workers)
+	print(f"Rendered {number_of_frames} frames to {arguments.frames_dir}")
+
+	if arguments.video:
+		encode(arguments.frames_dir, arguments.video, arguments.video_fps, number_of_frames)
+		print(f"Wrote {arguments.video}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,410 @@
+"""
+module_batch.py
+
+Headless, non-interactive entry point for the Fire Simulation project.
+Takes every parameter from arguments or a JSON config file instead of
+prompts, runs the simulation without any matplotlib figure and streams
+the population history to disk.
+
+Usage:
+	python module_batch.py --graph cnfg/graph2.dat --iterations 100 --seed 1 --output history.csv
+	python module_batch.py --config run.json
+	python module_batch.py --iterations 500 --seed 1 --checkpoint warm.npz
+	python module_batch.py --resume warm.npz --iterations 1000 --transmission 0.3
+	python module_batch.py --resume warm.npz --scenarios scenarios.json --output scenarios.csv
+"""
+
+import argparse
+import json
+import sys
+import numpy as np
+import classes
+import module_binary_graph as binary_graph
+import module_checkpoint as checkpoint
+import module_configuration as configuration
+import module_random
+import module_simulation as simulation
+import module_reporting as reporting
+import module_timing as timing
+import module_vectorized as vectorized
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, Sequence, Union
+
+#Defaults match the defaults of the interactive prompts in module_user_input
+DEFAULTS = {
+	'graph': None,				#Edge file (.dat), or None for a randomly generated graph
+	'sites': 200,				#Minimum number of sites of a randomly generated graph
+	'fraction_tree': 0.8,
+	'probabilities': {'combustion': 0.1, 'transmission': 0.5, 'respawn': 0.1},
+	'iterations': 50,
+	'firefighters': None,		#None for one firefighter per ten nodes
+	'skill': 5,
+	'seed': None,
+	'engine': 'objects',
+	'dispatch': 'random',		#Firefighter movement: 'random' (towards neighboring fire) or 'distance' (towards nearest fire)
+	'planarity': 'check',		#Planarity validation of loaded graphs: 'check', 'skip' or 'defer'
+	'output': 'history.csv',
+	'checkpoint': None,			#Checkpoint file saved after the last iteration, or None
+	'checkpoint_every': None,	#Iterations between checkpoints, None to only save after the last one
+}
+
+#Parameters that define graph and landscape, so they can not change when resuming from a checkpoint
+LANDSCAPE_KEYS = ('graph', 'sites', 'fraction_tree', 'seed', 'planarity')
+
+def load_config(path: str) -> Dict[str, Any]:
+	'''
+	Read run parameters from a JSON config file.
+
+	returns: dictionary of parameters (keys as in DEFAULTS)
+	'''
+	with open(path, 'r') as filestream:
+		config = json.load(filestream)
+
+	unknown = set(config) - set(DEFAULTS)
+	if unknown:
+		raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+
+	return config
+
+def make_config(**overrides: Any) -> Dict[str, Any]:
+	'''
+	Complete run parameters with defaults and validate them.
+
+	returns: dictionary of parameters
+	'''
+	config = {**DEFAULTS, **{key: value for key, value in overrides.items() if value is not None}}
+	config['probabilities'] = {**DEFAULTS['probabilities'], **config['probabilities']}
+
+	if not 0.0 <= config['fraction_tree'] <= 1.0:
+		raise ValueError("fraction_tree must be between 0.0 and 1.0")
+	for name, probability in config['probabilities'].items():
+		if not 0.0 <= probability <= 1.0:
+			raise ValueError(f"Probability '{name}' must be between 0.0 and 1.0")
+	if config['iterations'] <= 0:
+		raise ValueError("iterations must be greater than 0")
+	if config['firefighters'] is not None and config['firefighters'] <= 0:
+		raise ValueError("firefighters must be greater than 0")
+	if config['engine'] not in simulation.ENGINES:
+		raise ValueError(f"engine must be one of {simulation.ENGINES}")
+	if config['dispatch'] not in vectorized.DISPATCHES:
+		raise ValueError(f"dispatch must be one of {vectorized.DISPATCHES}")
+	if config['planarity'] not in configuration.PLANARITY_CHECKS:
+		raise ValueError(f"planarity must be one of {configuration.PLANARITY_CHECKS}")
+	if config['checkpoint_every'] is not None and config['checkpoint_every'] <= 0:
+		raise ValueError("checkpoint_every must be greater than 0")
+
+	return config
+
+def build_graph(config: Dict[str, Any],
+				rng: Optional[np.random.Generator] = None) -> Tuple[List[Tuple[int, int]], Optional[Dict[int, Tuple[float, float]]]]:
+	'''
+	Load the graph file from config, or generate a random graph (drawn from rng) if none is given.
+
+	returns: edges, pos (None for graphs loaded from file without stored positions)
+	'''
+	if config['graph'] is None:
+		return configuration.generate_random_graph(config['sites'], rng=rng)
+	edges = configuration.read_from_file(config['graph'], config['planarity'])
+	if is_binary_graph(config):
+		return edges, binary_graph.load_positions(config['graph'])
+	return edges, None
+
+def is_binary_graph(config: Dict[str, Any]) -> bool:
+	'''
+	Return whether the graph of config is loaded from a binary graph file.
+	'''
+	return config['graph'] not in (None, '-') and binary_graph.is_binary_graph(config['graph'])
+
+def build_adjacency(config: Dict[str, Any], edges: Union[List[Tuple[int, int]], np.ndarray]) -> classes.Adjacency:
+	'''
+	Create adjacency of the graph, memory-mapped from the graph file if it is a binary graph.
+
+	returns: Adjacency
+	'''
+	if is_binary_graph(config):
+		return binary_graph.load_adjacency(config['graph'])
+	return configuration.create_adjacency(edges)
+
+def number_of_firefighters(config: Dict[str, Any], number_of_nodes: int) -> int:
+	'''
+	Return number of firefighters from config (default one per ten nodes).
+	'''
+	firefighter_number = config['firefighters']
+	if firefighter_number is None:
+		firefighter_number = max(1, number_of_nodes//10)
+	if firefighter_number > number_of_nodes:
+		raise ValueError("There can not be more firefighters than nodes")
+	return firefighter_number
+
+def setup(config: Dict[str, Any]) -> Dict[str, Any]:
+	'''
+	Create the random number context from the seed and build graph,
+	landscape, land patches and firefighters from config.
+
+	returns: dictionary with config, edges, pos, nodes, cmap, adjacency,
+	land_patches, firefighters, rng (RandomContext), iteration (0) and
+	history (empty, see module_checkpoint.load_checkpoint)
+	'''
+	config = make_config(**config)
+
+	#Every random draw of the run comes from this context
+	rng = module_random.RandomContext(config['seed'])
+
+	#Graph
+	edges, pos = build_graph(config, rng.generator)
+	nodes = configuration.unique_nodes(edges)
+	firefighter_number = number_of_firefighters(config, len(nodes))
+
+	#Landscape, land patches and firefighters
+	cmap = configuration.create_color_map(nodes, config['fraction_tree'], rng.random)
+	adjacency = build_adjacency(config, edges)
+	land_patches = configuration.create_land_patches(cmap, nodes, edges, adjacency)
+	firefighters = configuration.create_firefighters(nodes, firefighter_number, config['skill'], rng.random)
+
+	return {'config': config, 'edges': edges, 'pos': pos, 'nodes': nodes, 'cmap': cmap,
+			'adjacency': adjacency, 'land_patches': land_patches, 'firefighters': firefighters, 'rng': rng,
+			'iteration': 0, 'history': np.zeros((3, 0), dtype=np.int64)}
+
+def restore(path: str, **overrides: Any) -> Dict[str, Any]:
+	'''
+	Load the state of a run from a checkpoint, changing run parameters
+	(e.g. probabilities, iterations or firefighters) by overrides. Parameters
+	of graph and landscape (LANDSCAPE_KEYS) can not change. Firefighters
+	are removed in reverse order of creation or added at random positions
+	(with skill around the 'skill' parameter) to match the new number.
+
+	Raises ValueError if overrides change the landscape or end the run
+	before the checkpoint.
+
+	returns: state dictionary (as setup, from the iteration of the checkpoint)
+	'''
+	state = checkpoint.load_checkpoint(path)
+	saved = state['config']
+
+	changed = [key for key in LANDSCAPE_KEYS if overrides.get(key) is not None and overrides[key] != saved[key]]
+	if changed:
+		raise ValueError(f"{changed} can not change when resuming from a checkpoint")
+
+	probabilities = {**saved['probabilities'], **(overrides.get('probabilities') or {})}
+	config = make_config(**{**saved, **overrides, 'probabilities': probabilities})
+	if config['iterations'] < state['iteration']:
+		raise ValueError(f"iterations must be at least {state['iteration']}, the iteration of the checkpoint")
+
+	#Match the number of firefighters of the new parameters
+	firefighters = state['firefighters']
+	firefighter_number = number_of_firefighters(config, len(state['nodes']))
+	for firefighter in list(firefighters.keys())[firefighter_number:]:
+		del firefighters[firefighter]
+	if firefighter_number > len(firefighters):
+		firefighters.update(configuration.create_firefighters(state['nodes'], firefighter_number - len(firefighters),
+															  config['skill'], state['rng'].random))
+
+	state['config'] = config
+	return state
+
+def run(config: Dict[str, Any], history: Optional[reporting.HistoryWriter] = None) -> Tuple[List[int], List[int], List[int]]:
+	'''
+	Build landscape and firefighters from config and run the simulation
+	without visualization. If history is given, the population history
+	is streamed to it instead of returned.
+
+	returns: fire_history, tree_history, rock_history
+	'''
+	return run_state(setup(config), history)
+
+def run_state(state: Dict[str, Any], history: Optional[reporting.HistoryWriter] = None,
+			  timer: Optional[timing.PhaseTimer] = None) -> Tuple[List[int], List[int], List[int]]:
+	'''
+	Run the simulation of a state (from setup or restore) without
+	visualization from its iteration up to the 'iterations' parameter,
+	saving checkpoints if the 'checkpoint' parameter is set and timing
+	phases if timer is given. The history of the state comes first in
+	the returned lists or in history.
+
+	returns: fire_history, tree_history, rock_history
+	'''
+	config = state['config']
+	checkpoints = None
+	if config['checkpoint'] is not None:
+		checkpoints = checkpoint.CheckpointWriter(config['checkpoint'], state, config['checkpoint_every'])
+
+	fire_history, tree_history, rock_history = (list(values) for values in state['history'].tolist())
+	if history is not None:
+		for row in zip(fire_history, tree_history, rock_history):
+			history.append(*row)
+		fire_history, tree_history, rock_history = [], [], []
+
+	iterations = config['iterations'] - state['iteration']
+	if iterations > 0:
+		histories = simulation.run(state['edges'], config['probabilities'], state['firefighters'], state['land_patches'],
+								   state['cmap'], iterations, config['engine'], state['adjacency'], state['rng'],
+								   history, checkpoints, timer, config['dispatch'])
+		fire_history += histories[0]
+		tree_history += histories[1]
+		rock_history += histories[2]
+
+	return fire_history, tree_history, rock_history
+
+def fork(path: str, scenarios: Sequence[Dict[str, Any]], workers: int = 1,
+		 independent: bool = False) -> List[np.ndarray]:
+	'''
+	Run one scenario per dictionary of parameter changes (see restore)
+	from the same checkpoint, so the run up to the checkpoint is only
+	simulated once. Scenarios continue the random number streams of the
+	checkpoint, so they only differ by their parameters, or get independent
+	child streams if independent is True. Scenarios do not save checkpoints.
+	With more than one worker, scenarios run in a process pool.
+
+	returns: history array of shape (3, iterations) with fire, tree and rock counts for each scenario
+	'''
+	tasks = [(path, dict(overrides), index if independent else None, len(scenarios))
+			 for index, overrides in enumerate(scenarios)]
+	if workers <= 1:
+		return [_run_scenario(task) for task in tasks]
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		return list(executor.map(_run_scenario, tasks))
+
+def _run_scenario(task: Tuple[str, Dict[str, Any], Optional[int], int]) -> np.ndarray:
+	'''
+	Restore the checkpoint with the parameter changes of one scenario and run it.
+
+	returns: history array of shape (3, iterations)
+	'''
+	path, overrides, stream, number_of_streams = task
+	state = restore(path, **overrides)
+	state['config']['checkpoint'] = None
+	if stream is not None:
+		state['rng'] = state['rng'].spawn(number_of_streams)[stream]
+
+	return np.array(run_state(state), dtype=np.int64)
+
+def make_parser(description: str = "Run the fire simulation without user interaction or visualization.") -> argparse.ArgumentParser:
+	'''
+	Create command line parser for the run parameters.
+
+	returns: ArgumentParser
+	'''
+	parser = argparse.ArgumentParser(description=description)
+	parser.add_argument('--config', help="JSON file with run parameters")
+	parser.add_argument('--graph', help="Edge file to load, '-' for standard input (default: randomly generated graph)")
+	parser.add_argument('--sites', type=int, help="Minimum number of sites of a randomly generated graph")
+	parser.add_argument('--fraction-tree', dest='fraction_tree', type=float, help="Initial fraction of tree patches")
+	parser.add_argument('--combustion', type=float, help="Probability of tree self combustion")
+	parser.add_argument('--transmission', type=float, help="Probability of fire transmission")
+	parser.add_argument('--respawn', type=float, help="Probability of rock to tree conversion")
+	parser.add_argument('--iterations', type=int, help="Number of iterations")
+	parser.add_argument('--firefighters', type=int, help="Number of firefighters")
+	parser.add_argument('--skill', type=float, help="Average firefighter skill level")
+	parser.add_argument('--seed', type=int, help="Seed for the random number generators")
+	parser.add_argument('--engine', choices=simulation.ENGINES, help="Simulation engine")
+	parser.add_argument('--dispatch', choices=vectorized.DISPATCHES,
+						help="Move firefighters towards neighboring fire (random) or all at once towards the nearest fire (distance)")
+	parser.add_argument('--planarity', choices=configuration.PLANARITY_CHECKS,
+						help="Check loaded graphs for planarity (cached), skip the check or defer it to a background thread")
+	parser.add_argument('--output', help="CSV file for the population history")
+	parser.add_argument('--checkpoint', help="File to save checkpoints of the full state to (after the last iteration)")
+	parser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, help="Also save a checkpoint every N iterations")
+	return parser
+
+def reject_options(parser: argparse.ArgumentParser, overrides: Dict[str, Any], engines: Sequence[str],
+				   options: Sequence[str] = ('checkpoint', 'checkpoint_every')) -> None:
+	'''
+	Exit with a parser error if overrides (see parse_overrides) choose an
+	engine other than engines or set options, for runners that reuse the
+	batch parser without supporting all of its arguments.
+	'''
+	engine = overrides.get('engine', engines[0])
+	if engine not in engines:
+		parser.error(f"--engine {engine} is not supported, runs use the {' or '.join(engines)} engine")
+	for name in options:
+		if overrides.get(name) is not None:
+			parser.error(f"--{name.replace('_', '-')} is not supported")
+
+def parse_arguments(argv: Optional[List[str]] = None, parser: Optional[argparse.ArgumentParser] = None) -> Dict[str, Any]:
+	'''
+	Parse command line arguments. Arguments override values from --config.
+
+	returns: dictionary of parameters
+	'''
+	return make_config(**parse_overrides(argv, parser))
+
+def parse_overrides(argv: Optional[List[str]] = None, parser: Optional[argparse.ArgumentParser] = None) -> Dict[str, Any]:
+	'''
+	Parse command line arguments into the parameters they set, without
+	defaults (e.g. to change the parameters of a checkpoint).
+	Arguments override values from --config.
+
+	returns: dictionary of given parameters
+	'''
+	if parser is None:
+		parser = make_parser()
+	arguments = vars(parser.parse_args(argv))
+
+	config_path = arguments.pop('config')
+	config = load_config(config_path) if config_path else {}
+
+	probabilities = dict(config.get('probabilities', {}))
+	for name in ('combustion', 'transmission', 'respawn'):
+		value = arguments.pop(name)
+		if value is not None:
+			probabilities[name] = value
+	config['probabilities'] = probabilities
+
+	config.update({key: value for key, value in arguments.items() if value is not None})
+
+	return config
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Run the simulation from command line arguments (or resume it, or fork
+	scenarios, from a checkpoint) and write the history.
+	'''
+	parser = make_parser()
+	parser.add_argument('--resume', help="Checkpoint to continue from, with the given arguments changing its parameters")
+	parser.add_argument('--scenarios', help="JSON file with a list of parameter changes, one scenario forked from --resume each")
+	parser.add_argument('--workers', type=int, default=1, help="Number of worker processes for --scenarios")
+	parser.add_argument('--independent', action='store_true', help="Give each scenario an independent random number stream")
+	parser.add_argument('--timing', action='store_true', help="Print the time spent in each phase of the simulation")
+	parser.add_argument('--trace', help="JSON file for a Chrome trace of the phases of every iteration")
+
+	arguments = parser.parse_args(argv)
+	overrides = parse_overrides(argv, parser)
+	for name in ('resume', 'scenarios', 'workers', 'independent', 'timing', 'trace'):
+		overrides.pop(name, None)
+
+	if arguments.scenarios is not None:
+		if arguments.resume is None:
+			parser.error("--scenarios requires --resume")
+		with open(arguments.scenarios, 'r') as filestream:
+			scenarios = json.load(filestream)
+		#Probabilities of a scenario change single probabilities of the command line, not all of them
+		scenarios = [{**overrides, **scenario, 'probabilities': {**(overrides.get('probabilities') or {}),
+																 **(scenario.get('probabilities') or {})}}
+					 for scenario in scenarios]
+		histories = fork(arguments.resume, scenarios, arguments.workers, arguments.independent)
+		output = overrides.get('output', 'scenarios.csv')
+		reporting.write_scenarios(output, histories)
+		print(f"Wrote {len(histories)} scenarios to {output}")
+		return
+
+	if arguments.resume is not None:
+		state = restore(arguments.resume, **overrides)
+	else:
+		state = setup(overrides)
+	config = state['config']
+	timer = None
+	if arguments.timing or arguments.trace is not None:
+		timer = timing.PhaseTimer(trace=arguments.trace is not None)
+	with reporting.HistoryWriter(config['output']) as history:
+		run_state(state, history, timer)
+		configuration.wait_for_planarity()
+	print(f"Wrote {history.iterations} iterations to {config['output']}")
+
+	if timer is not None:
+		print(timer.format_summary())
+	if arguments.trace is not None:
+		timer.write_trace(arguments.trace)
+		print(f"Wrote trace to {arguments.trace}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
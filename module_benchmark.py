@@ -0,0 +1,386 @@
+"""
+module_benchmark.py
+
+Benchmark suite for the Fire Simulation project. Times the hot paths
+(graph generation, file loading, landscape setup, simulation updates,
+domain-decomposed runs, population history and drawing) on synthetic Voronoi graphs of growing
+size, so results are scaling curves rather than single numbers. Update
+benchmarks time UPDATE_TICKS ticks from the same freshly built landscape
+on every call, so all sizes are timed in the same phase of a run. Results
+are saved to JSON and can be compared against a saved baseline, flagging
+every benchmark and size that got slower than a threshold.
+
+Usage:
+	python module_benchmark.py --output baseline.json
+	python module_benchmark.py --sizes 100 1000 10000 --baseline baseline.json --output current.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import graph_helper as gh
+import module_binary_graph as binary_graph
+import module_configuration as configuration
+import module_domain as domain
+import module_file_reader as fr
+import module_random
+import module_simulation as simulation
+import module_vectorized as vectorized
+from typing import List, Tuple, Dict, Any, Callable, Optional, Sequence, TYPE_CHECKING
+
+#Only needed for type hints, matplotlib is imported when a benchmark draws
+if TYPE_CHECKING:
+	import visualiser_random_forest_graph as vr
+
+#Default graph sizes (minimum number of nodes) of the scaling curves
+SIZES = (100, 1000, 10000, 100000, 1000000)
+
+#Parameters of the simulated landscape
+FRACTION_TREE = 0.8
+PROBABILITIES = {'combustion': 0.1, 'transmission': 0.5, 'respawn': 0.1}
+
+#Number of ticks timed per call of the update benchmarks
+UPDATE_TICKS = 10
+
+#Benchmarks that build and draw a Visualiser, only run up to DRAWING_MAX_SIZE nodes by default
+DRAWING_BENCHMARKS = ('update_render', 'update_node_colours', 'update_node_edges')
+DRAWING_MAX_SIZE = 100000
+
+#Numbers of worker processes of the domain-decomposed run benchmarks
+DOMAIN_WORKERS = (1, 2, 4)
+
+def synthetic_graph(size: int, directory: str, seed: int = 0) -> Dict[str, Any]:
+	'''
+	Generate a Voronoi graph with at least size nodes and write it to an
+	edge file and a binary graph file in directory.
+
+	returns: dictionary with size, edges, pos, nodes, path (edge file) and binary_path
+	'''
+	edges, positions = gh.voronoi_graph(size, seed=seed)
+	pos = dict(enumerate(map(tuple, positions.tolist())))
+
+	path = os.path.join(directory, f"graph_{size}.dat")
+	np.savetxt(path, edges, fmt='%d', delimiter=', ')
+	binary_path = os.path.join(directory, f"graph_{size}.fgraph")
+	binary_graph.write_graph(binary_path, edges, pos, planar=True)
+
+	return {'size': size, 'edges': edges, 'pos': pos, 'nodes': configuration.unique_nodes(edges),
+			'path': path, 'binary_path': binary_path}
+
+def landscape(graph: Dict[str, Any], seed: int = 0) -> Dict[str, Any]:
+	'''
+	Create color map, adjacency, land patches and firefighters (one per ten nodes) for a graph.
+
+	returns: dictionary with cmap, adjacency, land_patches, firefighters and rng
+	'''
+	rng = module_random.RandomContext(seed)
+	nodes = graph['nodes']
+	cmap = configuration.create_color_map(nodes, FRACTION_TREE, rng.random)
+	adjacency = configuration.create_adjacency(graph['edges'])
+	land_patches = configuration.create_land_patches(cmap, nodes, graph['edges'], adjacency)
+	firefighters = configuration.create_firefighters(nodes, max(1, len(nodes)//10), 5, rng.random)
+
+	return {'cmap': cmap, 'adjacency': adjacency, 'land_patches': land_patches,
+			'firefighters': firefighters, 'rng': rng}
+
+def visualiser(graph: Dict[str, Any]) -> 'vr.Visualiser':
+	'''
+	Create an off-screen Visualiser (Agg backend) reusing its artists, without pauses between frames.
+	'''
+	import matplotlib
+	matplotlib.use('Agg')
+	import visualiser_random_forest_graph as vr
+
+	return vr.Visualiser(graph['edges'], pos_nodes=graph['pos'], reuse_artists=True, pause=0)
+
+#Each benchmark creates, from a synthetic graph, the function that is timed, or
+#for stateful functions a (function, reset) pair where reset restores the state
+def _voronoi_to_edges(graph: Dict[str, Any]) -> Callable[[], Any]:
+	return lambda: gh.voronoi_to_edges(graph['size'])
+
+def _read_edges(graph: Dict[str, Any]) -> Callable[[], Any]:
+	return lambda: fr.read_edges(graph['path'])
+
+def _load_binary(graph: Dict[str, Any]) -> Callable[[], Any]:
+	def load() -> int:
+		#Touch the data, as mapping alone reads nothing from the file
+		edges = binary_graph.read_edges(graph['binary_path'])
+		adjacency = binary_graph.load_adjacency(graph['binary_path'])
+		return int(np.asarray(edges).sum()) + int(np.asarray(adjacency.neighbor_index).sum())
+	return load
+
+def _create_adjacency(graph: Dict[str, Any]) -> Callable[[], Any]:
+	return lambda: configuration.create_adjacency(graph['edges'])
+
+def _create_land_patches(graph: Dict[str, Any]) -> Callable[[], Any]:
+	state = landscape(graph)
+	return lambda: configuration.create_land_patches(state['cmap'], graph['nodes'], graph['edges'], state['adjacency'])
+
+def _update(graph: Dict[str, Any], render: bool = False) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+	state = {}
+	figure = visualiser(graph) if render else None
+
+	def reset() -> None:
+		state.update(landscape(graph))
+		state['occupancy'] = configuration.create_occupancy(state['firefighters'])
+		state['population'] = simulation.count_population(state['land_patches'])
+		state['histories'] = ([], [], [])
+
+	def update() -> None:
+		for _ in range(UPDATE_TICKS):
+			simulation.update(graph['edges'], PROBABILITIES, figure, state['firefighters'], state['land_patches'],
+							  state['cmap'], *state['histories'], state['occupancy'], render, state['population'],
+							  state['rng'].random)
+	return update, reset
+
+def _update_render(graph: Dict[str, Any]) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+	return _update(graph, render=True)
+
+def _update_arrays(graph: Dict[str, Any], engine: type) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+	state = {}
+
+	def reset() -> None:
+		state.update(landscape(graph))
+		state['patch_arrays'] = engine(state['land_patches'], state['adjacency'], state['rng'].generator)
+		state['histories'] = ([], [], [])
+
+	def update() -> None:
+		for _ in range(UPDATE_TICKS):
+			simulation.update_vectorized(PROBABILITIES, None, state['firefighters'], state['patch_arrays'], None,
+										 *state['histories'])
+	return update, reset
+
+def _update_vectorized(graph: Dict[str, Any]) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+	return _update_arrays(graph, vectorized.PatchArrays)
+
+def _update_frontier(graph: Dict[str, Any]) -> Tuple[Callable[[], Any], Callable[[], Any]]:
+	return _update_arrays(graph, vectorized.FrontierPatchArrays)
+
+def _run_domains(graph: Dict[str, Any], workers: int) -> Callable[[], Any]:
+	config = {'graph': graph['binary_path'], 'iterations': UPDATE_TICKS, 'seed': 0,
+			  'fraction_tree': FRACTION_TREE, 'probabilities': PROBABILITIES}
+	return lambda: domain.run_domains(config, workers)
+
+def _population_history(graph: Dict[str, Any]) -> Callable[[], Any]:
+	state = landscape(graph)
+	histories = ([], [], [])
+	return lambda: simulation.population_history(state['land_patches'], *histories)
+
+def _update_node_colours(graph: Dict[str, Any]) -> Callable[[], Any]:
+	state = landscape(graph)
+	figure = visualiser(graph)
+	return lambda: figure.update_node_colours(state['cmap'])
+
+def _update_node_edges(graph: Dict[str, Any]) -> Callable[[], Any]:
+	state = landscape(graph)
+	figure = visualiser(graph)
+	positions = [firefighter.position for firefighter in state['firefighters'].keys()]
+	figure.update_node_colours(state['cmap'])
+	return lambda: figure.update_node_edges(positions)
+
+BENCHMARKS = {
+	'voronoi_to_edges': _voronoi_to_edges,
+	'read_edges': _read_edges,
+	'load_binary': _load_binary,
+	'create_adjacency': _create_adjacency,
+	'create_land_patches': _create_land_patches,
+	'update': _update,
+	'update_render': _update_render,
+	'update_vectorized': _update_vectorized,
+	'update_frontier': _update_frontier,
+	**{f'domain_{workers}': (lambda graph, workers=workers: _run_domains(graph, workers)) for workers in DOMAIN_WORKERS},
+	'population_history': _population_history,
+	'update_node_colours': _update_node_colours,
+	'update_node_edges': _update_node_edges,
+}
+
+def measure(function: Callable[[], Any], repeat: int = 3, minimum_time: float = 0.2,
+			reset: Optional[Callable[[], Any]] = None) -> List[float]:
+	'''
+	Time function after one warm-up call. Each of the repeat measurements
+	calls it often enough to last about minimum_time, so fast functions
+	are not dominated by timer resolution. If reset is given, it is called
+	(untimed) before every call, so stateful functions are always timed
+	from the same state.
+
+	returns: seconds per call of each measurement
+	'''
+	def timed(number: int) -> float:
+		if reset is None:
+			start = time.perf_counter()
+			for _ in range(number):
+				function()
+			return time.perf_counter() - start
+
+		elapsed = 0.0
+		for _ in range(number):
+			reset()
+			start = time.perf_counter()
+			function()
+			elapsed += time.perf_counter() - start
+		return elapsed
+
+	first = timed(1)
+	number = max(1, int(minimum_time / max(first, 1e-9)))
+
+	return [timed(number) / number for _ in range(repeat)]
+
+def scaling_exponent(curve: Dict[str, Dict[str, Any]]) -> Optional[float]:
+	'''
+	Fit time ~ size^k to the median times of a scaling curve (keys are sizes).
+
+	returns: exponent k, or None if fewer than two sizes were measured
+	'''
+	sizes = [int(size) for size in curve]
+	if len(sizes) < 2:
+		return None
+	medians = [curve[str(size)]['median'] for size in sizes]
+	return float(np.polyfit(np.log(sizes), np.log(medians), 1)[0])
+
+def run_benchmarks(sizes: Sequence[int] = SIZES,
+				   names: Optional[Sequence[str]] = None,
+				   repeat: int = 3,
+				   budget: float = 30.0,
+				   seed: int = 0,
+				   progress: Optional[Callable[[str], None]] = None,
+				   drawing_max_size: Optional[int] = DRAWING_MAX_SIZE) -> Dict[str, Any]:
+	'''
+	Run benchmarks (all of BENCHMARKS if names is None) on synthetic graphs
+	of the given sizes, smallest first. A benchmark is not run on a larger
+	graph if one call is expected to take longer than budget seconds there,
+	extrapolated from the smaller sizes (at least linearly in the size).
+	Drawing benchmarks are not run on graphs larger than drawing_max_size
+	(if given), as building their figures alone takes long.
+
+	returns: dictionary with 'meta' (environment) and 'results', mapping each
+	benchmark to its scaling curve (size to min, median and times) and exponent
+	'''
+	if names is None:
+		names = list(BENCHMARKS)
+	unknown = set(names) - set(BENCHMARKS)
+	if unknown:
+		raise ValueError(f"Unknown benchmarks {sorted(unknown)}, choose from {list(BENCHMARKS)}")
+
+	results = {name: {'curve': {}, 'exponent': None} for name in names}
+	over_budget = set()
+	with tempfile.TemporaryDirectory() as directory:
+		for size in sorted(sizes):
+			graph = synthetic_graph(size, directory, seed)
+			for name in names:
+				curve = results[name]['curve']
+				if curve:
+					last = max(curve, key=int)
+					growth = (size / int(last))**max(1.0, scaling_exponent(curve) or 1.0)
+					if curve[last]['min']*growth > budget:
+						over_budget.add(name)
+				if drawing_max_size is not None and name in DRAWING_BENCHMARKS and size > drawing_max_size:
+					over_budget.add(name)
+				if name in over_budget:
+					continue
+				benchmark = BENCHMARKS[name](graph)
+				function, reset = benchmark if isinstance(benchmark, tuple) else (benchmark, None)
+				times = measure(function, repeat, reset=reset)
+				results[name]['curve'][str(size)] = {'nodes': len(graph['nodes']), 'min': min(times),
+													 'median': float(np.median(times)), 'times': times}
+				if progress is not None:
+					progress(f"{name:<20} {size:>8} {np.median(times):12.6f} s")
+
+				#Close figures of drawing benchmarks before the next graph
+				if 'matplotlib.pyplot' in sys.modules:
+					sys.modules['matplotlib.pyplot'].close('all')
+			del graph
+
+	for result in results.values():
+		result['exponent'] = scaling_exponent(result['curve'])
+
+	meta = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+			'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+			'repeat': repeat, 'seed': seed}
+	return {'meta': meta, 'results': results}
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 1.25) -> List[Dict[str, Any]]:
+	'''
+	Compare median times with a baseline for every benchmark and size in both.
+
+	returns: list of rows with benchmark, size, baseline, current, ratio
+	(current/baseline) and regression (ratio above threshold)
+	'''
+	rows = []
+	for name, result in results['results'].items():
+		baseline_curve = baseline['results'].get(name, {}).get('curve', {})
+		for size, point in result['curve'].items():
+			if size not in baseline_curve:
+				continue
+			ratio = point['median'] / baseline_curve[size]['median']
+			rows.append({'benchmark': name, 'size': int(size), 'baseline': baseline_curve[size]['median'],
+						 'current': point['median'], 'ratio': ratio, 'regression': ratio > threshold})
+
+	return rows
+
+def format_results(results: Dict[str, Any]) -> str:
+	'''
+	Format median times as a table with one row per benchmark, one column
+	per size and the fitted scaling exponent.
+	'''
+	sizes = sorted({int(size) for result in results['results'].values() for size in result['curve']})
+	lines = [f"{'benchmark':<20}" + ''.join(f"{size:>12}" for size in sizes) + f"{'exponent':>10}"]
+	for name, result in results['results'].items():
+		cells = [f"{result['curve'][str(size)]['median']:12.2e}" if str(size) in result['curve'] else f"{'-':>12}"
+				 for size in sizes]
+		exponent = f"{result['exponent']:10.2f}" if result['exponent'] is not None else f"{'-':>10}"
+		lines.append(f"{name:<20}" + ''.join(cells) + exponent)
+
+	return '\n'.join(lines)
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+	'''
+	Format a comparison (see compare) as a table, marking regressions.
+	'''
+	lines = [f"{'benchmark':<20}{'size':>10}{'baseline':>12}{'current':>12}{'ratio':>8}"]
+	for row in rows:
+		lines.append(f"{row['benchmark']:<20}{row['size']:>10}{row['baseline']:12.2e}{row['current']:12.2e}"
+					 f"{row['ratio']:8.2f}" + ("  REGRESSION" if row['regression'] else ""))
+
+	return '\n'.join(lines)
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Run benchmarks from command line arguments, save the results and compare
+	them with a baseline. Exits with status 1 if any benchmark regressed.
+	'''
+	parser = argparse.ArgumentParser(description="Time the hot paths of the fire simulation on graphs of growing size.")
+	parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Minimum numbers of nodes of the synthetic graphs")
+	parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), help="Benchmarks to run (default: all)")
+	parser.add_argument('--repeat', type=int, default=3, help="Number of measurements per benchmark and size")
+	parser.add_argument('--budget', type=float, default=30.0, help="Skip larger sizes once one call is expected to take longer (seconds)")
+	parser.add_argument('--drawing-max-size', type=int, default=DRAWING_MAX_SIZE,
+						help="Largest size of the drawing benchmarks (0 for no limit)")
+	parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic graphs and landscapes")
+	parser.add_argument('--output', default='benchmark.json', help="JSON file for the results")
+	parser.add_argument('--baseline', help="JSON file of earlier results to compare with")
+	parser.add_argument('--threshold', type=float, default=1.25, help="Slowdown ratio reported as regression")
+	arguments = parser.parse_args(argv)
+
+	results = run_benchmarks(arguments.sizes, arguments.benchmarks, arguments.repeat, arguments.budget,
+							 arguments.seed, progress=print, drawing_max_size=arguments.drawing_max_size or None)
+	with open(arguments.output, 'w') as filestream:
+		json.dump(results, filestream, indent=1)
+	print(format_results(results))
+	print(f"Wrote results to {arguments.output}")
+
+	if arguments.baseline is not None:
+		with open(arguments.baseline, 'r') as filestream:
+			rows = compare(results, json.load(filestream), arguments.threshold)
+		print(format_comparison(rows))
+		regressions = sum(row['regression'] for row in rows)
+		if regressions:
+			print(f"{regressions} regressions above {arguments.threshold:.2f}x")
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
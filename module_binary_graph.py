@@ -0,0 +1,214 @@
+"""
+module_binary_graph.py
+
+Compact binary graph format for the Fire Simulation project.
+Converts .dat edge files once into a binary file holding the edges as
+int32, optionally the CSR adjacency and node positions. Loading maps the
+file into memory without parsing or copying, so huge graphs open in
+milliseconds.
+
+File layout (little endian): a 64 byte header (magic, version, flags,
+number of edges, nodes and neighbor pairs) followed by the sections
+edges (int32, edges x 2), nodes (int32), offsets (int64, nodes + 1),
+neighbor_index (int32) and positions (float64, nodes x 2), each starting
+at a multiple of 64 bytes. Sections not marked in flags are left out.
+
+Usage:
+	python module_binary_graph.py cnfg/graph6.dat graph6.fgraph --layout
+"""
+
+import argparse
+import sys
+import numpy as np
+import classes
+import module_configuration as configuration
+import module_file_reader as fr
+from typing import List, Tuple, Dict, Any, Optional, Union
+
+MAGIC = b'FIREGRPH'
+VERSION = 1
+ALIGNMENT = 64
+
+#Flags of the header
+CSR = 1			#File holds nodes, offsets and neighbor_index
+POSITIONS = 2	#File holds nodes and positions
+PLANAR = 4		#Graph was checked to be planar on conversion
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('flags', '<u4'),
+				   ('edges', '<u8'), ('nodes', '<u8'), ('neighbors', '<u8')])
+
+def _sections(header: np.void) -> List[Tuple[str, np.dtype, Tuple[int, ...]]]:
+	'''
+	Return name, dtype and shape of the sections present in a file, in file order.
+	'''
+	flags = int(header['flags'])
+	number_of_nodes = int(header['nodes'])
+
+	sections = [('edges', np.dtype('<i4'), (int(header['edges']), 2))]
+	if flags & (CSR | POSITIONS):
+		sections.append(('nodes', np.dtype('<i4'), (number_of_nodes,)))
+	if flags & CSR:
+		sections.append(('offsets', np.dtype('<i8'), (number_of_nodes + 1,)))
+		sections.append(('neighbor_index', np.dtype('<i4'), (int(header['neighbors']),)))
+	if flags & POSITIONS:
+		sections.append(('positions', np.dtype('<f8'), (number_of_nodes, 2)))
+	return sections
+
+def _aligned(position: int) -> int:
+	return -(-position // ALIGNMENT) * ALIGNMENT
+
+def is_binary_graph(path: str) -> bool:
+	'''
+	Return whether the file at path is a binary graph (starts with MAGIC).
+	'''
+	with open(path, 'rb') as filestream:
+		return filestream.read(len(MAGIC)) == MAGIC
+
+def write_graph(path: str,
+				edges: Union[List[Tuple[int, int]], np.ndarray],
+				pos: Optional[Dict[int, Tuple[float, float]]] = None,
+				csr: bool = True,
+				planar: bool = False) -> None:
+	'''
+	Write edges, and optionally CSR adjacency and node positions, to a binary graph file.
+	Planar marks the graph as already checked for planarity.
+
+	Raises ValueError if node ids do not fit into int32.
+	'''
+	edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+	int32 = np.iinfo(np.int32)
+	if len(edges) and (edges.min() < int32.min or edges.max() > int32.max):
+		raise ValueError("Node ids must fit into 32 bit integers")
+
+	flags = (CSR if csr else 0) | (POSITIONS if pos else 0) | (PLANAR if planar else 0)
+	arrays = {'edges': edges}
+	header = np.zeros((), dtype=HEADER)
+	header['magic'], header['version'], header['flags'], header['edges'] = MAGIC, VERSION, flags, len(edges)
+
+	if csr or pos:
+		adjacency = classes.Adjacency(edges)
+		header['nodes'] = len(adjacency)
+		arrays['nodes'] = adjacency.nodes
+		if csr:
+			header['neighbors'] = len(adjacency.neighbor_index)
+			arrays['offsets'] = adjacency.offsets
+			arrays['neighbor_index'] = adjacency.neighbor_index
+		if pos:
+			arrays['positions'] = np.array([pos[int(node)] for node in adjacency.nodes], dtype=np.float64)
+
+	with open(path, 'wb') as filestream:
+		filestream.write(header.tobytes())
+		for name, dtype, shape in _sections(header):
+			filestream.seek(_aligned(filestream.tell()))
+			np.ascontiguousarray(arrays[name], dtype=dtype).reshape(shape).tofile(filestream)
+
+def load_graph(path: str) -> Dict[str, Any]:
+	'''
+	Memory-map a binary graph file. Arrays are read-only views of the file.
+
+	Raises ValueError if the file is not a binary graph of a supported version.
+
+	returns: dictionary with 'edges', 'nodes', 'offsets', 'neighbor_index' and
+	'positions' (None if not in the file) and 'planar' (bool)
+	'''
+	header = np.fromfile(path, dtype=HEADER, count=1)
+	if len(header) == 0 or header[0]['magic'] != MAGIC:
+		raise ValueError(f"'{path}' is not a binary graph file")
+	header = header[0]
+	if header['version'] != VERSION:
+		raise ValueError(f"Unsupported binary graph version {header['version']} in '{path}'")
+
+	graph = {'edges': None, 'nodes': None, 'offsets': None, 'neighbor_index': None, 'positions': None,
+			 'planar': bool(header['flags'] & PLANAR)}
+	offset = HEADER.itemsize
+	for name, dtype, shape in _sections(header):
+		offset = _aligned(offset)
+		size = int(np.prod(shape))
+		#Empty sections can not be memory-mapped
+		graph[name] = (np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape) if size
+					   else np.empty(shape, dtype=dtype))
+		offset += size * dtype.itemsize
+
+	return graph
+
+def read_edges(path: str) -> np.ndarray:
+	'''
+	Memory-map the edges of a binary graph file. Graphs not checked for
+	planarity on conversion are checked here (cached, see configuration.is_planar).
+
+	Raises ValueError if the file has no edges or the graph is not planar.
+
+	returns: edge array of shape (edges, 2)
+	'''
+	graph = load_graph(path)
+	if len(graph['edges']) == 0:
+		raise ValueError(f"'{path}' produced no edges")
+	if not graph['planar'] and not configuration.is_planar(graph['edges']):
+		raise ValueError(f"The graph defined by the edges in '{path}' is not planar")
+	return graph['edges']
+
+def load_adjacency(path: str) -> classes.Adjacency:
+	'''
+	Create adjacency of a binary graph file, zero-copy from its CSR arrays
+	if present and built from its edges otherwise.
+
+	returns: Adjacency
+	'''
+	graph = load_graph(path)
+	if graph['offsets'] is None:
+		return classes.Adjacency(graph['edges'])
+	return classes.Adjacency.from_arrays(graph['nodes'], graph['offsets'], graph['neighbor_index'])
+
+def load_positions(path: str) -> Optional[Dict[int, Tuple[float, float]]]:
+	'''
+	Return node positions stored in a binary graph file.
+
+	returns: dictionary of node positions, or None if the file has none
+	'''
+	graph = load_graph(path)
+	if graph['positions'] is None:
+		return None
+	return dict(zip(graph['nodes'].tolist(), map(tuple, graph['positions'].tolist())))
+
+def convert_file(source: str, destination: str, csr: bool = True, layout: bool = False, check_planar: bool = True) -> int:
+	'''
+	Convert a .dat edge file to a binary graph file, optionally with the
+	layout of the nodes used by the Visualiser (see module_layout) computed once.
+
+	Raises ValueError if the file produces no edges or the graph is not planar.
+
+	returns: number of edges written
+	'''
+	edges = fr.read_edges(source)
+	if len(edges) == 0:
+		raise ValueError(f"'{source}' produced no edges")
+	if check_planar and not configuration.is_planar(edges):
+		raise ValueError(f"The graph defined by the edges in '{source}' is not planar")
+
+	pos = None
+	if layout:
+		import module_layout
+		pos = module_layout.cached_layout(edges)
+
+	write_graph(destination, edges, pos, csr, planar=check_planar)
+	return len(edges)
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Convert a .dat edge file from command line arguments.
+	'''
+	parser = argparse.ArgumentParser(description="Convert a .dat edge file into a memory-mappable binary graph file.")
+	parser.add_argument('source', help="Edge file (.dat), '-' for standard input")
+	parser.add_argument('destination', help="Binary graph file to write")
+	parser.add_argument('--no-csr', dest='csr', action='store_false', help="Do not store the CSR adjacency")
+	parser.add_argument('--layout', action='store_true', help="Compute and store node positions for the Visualiser")
+	parser.add_argument('--no-check', dest='check_planar', action='store_false',
+						help="Skip the planarity check (it then runs each time the file is loaded)")
+	arguments = parser.parse_args(argv)
+
+	number_of_edges = convert_file(arguments.source, arguments.destination, arguments.csr,
+								   arguments.layout, arguments.check_planar)
+	print(f"Wrote {number_of_edges} edges to {arguments.destination}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
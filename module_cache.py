@@ -0,0 +1,89 @@
+"""
+module_cache.py
+
+On-disk cache for results derived from graphs (e.g. planarity checks
+and layouts) for the Fire Simulation project. Results are stored as
+small JSON files or .npz files of arrays, one per key, in namespaces
+under the cache directory
+($FIRE_SIMULATION_CACHE, or ~/.cache/fire_simulation). Keys are content
+hashes, so a changed graph never hits a stale result.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Any, Callable, Dict, IO, Optional
+
+def cache_directory() -> str:
+	'''
+	Return the cache directory.
+	'''
+	return os.environ.get('FIRE_SIMULATION_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'fire_simulation'))
+
+def hash_array(array: Any) -> str:
+	'''
+	Return SHA-256 hex digest of the values and shape of an integer array (e.g. edges).
+	'''
+	array = np.ascontiguousarray(array, dtype=np.int64)
+	digest = hashlib.sha256(str(array.shape).encode())
+	digest.update(array.data)
+	return digest.hexdigest()
+
+def _path(namespace: str, key: str, extension: str = '.json') -> str:
+	return os.path.join(cache_directory(), namespace, key + extension)
+
+def _replace(path: str, write: Callable[[IO], None]) -> None:
+	'''
+	Write a cache file through a temporary file that replaces path atomically.
+	Failures are ignored as the cache is optional.
+	'''
+	try:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+		try:
+			with os.fdopen(descriptor, 'wb') as filestream:
+				write(filestream)
+			os.replace(temporary, path)
+		except BaseException:
+			os.unlink(temporary)
+			raise
+	except OSError:
+		pass
+
+def load(namespace: str, key: str) -> Optional[Any]:
+	'''
+	Return cached value of key in namespace.
+
+	returns: value, or None if not cached (or the cache can not be read)
+	'''
+	try:
+		with open(_path(namespace, key), 'r') as filestream:
+			return json.load(filestream)
+	except (OSError, ValueError):
+		return None
+
+def store(namespace: str, key: str, value: Any) -> None:
+	'''
+	Cache a JSON serializable value under key in namespace.
+	'''
+	_replace(_path(namespace, key), lambda filestream: filestream.write(json.dumps(value).encode()))
+
+def load_arrays(namespace: str, key: str) -> Optional[Dict[str, np.ndarray]]:
+	'''
+	Return cached arrays of key in namespace.
+
+	returns: dictionary of arrays, or None if not cached (or the cache can not be read)
+	'''
+	try:
+		with np.load(_path(namespace, key, '.npz')) as arrays:
+			return {name: arrays[name] for name in arrays.files}
+	except (OSError, ValueError):
+		return None
+
+def store_arrays(namespace: str, key: str, **arrays: np.ndarray) -> None:
+	'''
+	Cache arrays under key in namespace.
+	'''
+	_replace(_path(namespace, key, '.npz'), lambda filestream: np.savez(filestream, **arrays))
@@ -0,0 +1,159 @@
+"""
+module_checkpoint.py
+
+Checkpoints of a running simulation for the Fire Simulation project.
+A checkpoint holds the full state of a run (graph, patch types,
+treestats, fire flags, firefighter positions and skills, random number
+streams and the population history so far) in one compressed .npz
+file, so a run can be resumed after a crash, or several scenarios can
+be forked from one burned-in state (see module_batch.restore and fork).
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+import classes
+import module_configuration as configuration
+import module_random
+import module_vectorized as vectorized
+from array import array
+from typing import Any, Dict, Optional, Sequence
+
+#Version of the checkpoint layout, stored in every checkpoint
+VERSION = 1
+
+def save_checkpoint(path: str,
+					state: Dict[str, Any],
+					iteration: int,
+					history: Sequence[Sequence[int]],
+					patch_arrays: Optional[vectorized.PatchArrays] = None) -> None:
+	'''
+	Save the state of a run (as created by module_batch.setup) after the
+	given number of iterations, with its fire, tree and rock history.
+	Land patches are read from patch_arrays if given (array engines) and
+	from state['land_patches'] otherwise. The file is replaced atomically,
+	so an interrupted save keeps the previous checkpoint.
+
+	returns: None
+	'''
+	land_patches = state['land_patches']
+	nodes = np.fromiter(land_patches.keys(), dtype=np.int64, count=len(land_patches))
+
+	#Patch state in land_patches order
+	if patch_arrays is not None:
+		tree, treestats, fire = patch_arrays.state()
+		index = np.searchsorted(patch_arrays.adjacency.nodes, nodes)
+		tree, treestats, fire = tree[index], treestats[index], fire[index]
+	else:
+		patches = list(land_patches.values())
+		tree = np.array([isinstance(patch, classes.Treepatch) for patch in patches], dtype=bool)
+		treestats = np.array([patch.treestats if isinstance(patch, classes.Treepatch) else 0
+							  for patch in patches], dtype=np.int64)
+		fire = np.array([patch.fire is True for patch in patches], dtype=bool)
+
+	firefighters = list(state['firefighters'].keys())
+	arrays = {'edges': np.asarray(state['edges'], dtype=np.int64).reshape(-1, 2),
+			  'nodes': nodes, 'tree': tree, 'treestats': treestats, 'fire': fire,
+			  'firefighter_positions': np.array([firefighter.position for firefighter in firefighters], dtype=np.int64),
+			  'firefighter_skills': np.array([firefighter.skill for firefighter in firefighters], dtype=np.float64),
+			  'history': np.array([list(values) for values in history], dtype=np.int64).reshape(3, -1)}
+	if state['pos'] is not None:
+		arrays['pos_nodes'] = np.fromiter(state['pos'].keys(), dtype=np.int64, count=len(state['pos']))
+		arrays['positions'] = np.array(list(state['pos'].values()), dtype=np.float64).reshape(-1, 2)
+
+	meta = {'version': VERSION, 'iteration': iteration, 'config': state['config'], 'rng': state['rng'].get_state()}
+	arrays['meta'] = np.array(json.dumps(meta))
+
+	directory = os.path.dirname(os.path.abspath(path))
+	descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	try:
+		with os.fdopen(descriptor, 'wb') as filestream:
+			np.savez_compressed(filestream, **arrays)
+		os.replace(temporary, path)
+	except BaseException:
+		os.unlink(temporary)
+		raise
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+	'''
+	Load a checkpoint saved by save_checkpoint.
+
+	Raises ValueError if the file is not a checkpoint of a supported version.
+
+	returns: dictionary with config, edges, pos, nodes, cmap, adjacency,
+	land_patches, firefighters and rng (as module_batch.setup), iteration
+	and history (array of shape (3, iteration) with fire, tree and rock counts)
+	'''
+	with np.load(path) as arrays:
+		if 'meta' not in arrays.files:
+			raise ValueError(f"'{path}' is not a checkpoint")
+		meta = json.loads(str(arrays['meta']))
+		if meta['version'] != VERSION:
+			raise ValueError(f"Unsupported checkpoint version {meta['version']} in '{path}'")
+		arrays = {name: arrays[name] for name in arrays.files}
+
+	edges = arrays['edges']
+	nodes = arrays['nodes'].tolist()
+	tree = arrays['tree']
+	pos = None
+	if 'positions' in arrays:
+		pos = dict(zip(arrays['pos_nodes'].tolist(), map(tuple, arrays['positions'].tolist())))
+
+	#Land patches in the saved order, so the object engine draws in the same order
+	cmap = dict(zip(arrays['nodes'][tree].tolist(), arrays['treestats'][tree].tolist()))
+	adjacency = configuration.create_adjacency(edges)
+	land_patches = configuration.create_land_patches(cmap, nodes, edges, adjacency)
+	for node in arrays['nodes'][arrays['fire'] & tree].tolist():
+		land_patches[node].fire = True
+
+	firefighters = {classes.Firefighter(skill=skill, position=position): position for skill, position
+					in zip(arrays['firefighter_skills'].tolist(), arrays['firefighter_positions'].tolist())}
+
+	return {'config': meta['config'], 'edges': edges, 'pos': pos, 'nodes': set(nodes), 'cmap': cmap,
+			'adjacency': adjacency, 'land_patches': land_patches, 'firefighters': firefighters,
+			'rng': module_random.RandomContext.from_state(meta['rng']),
+			'iteration': meta['iteration'], 'history': arrays['history']}
+
+class CheckpointWriter:
+	'''
+	Saves checkpoints of a running simulation every given number of
+	iterations. The simulation records the population of each iteration
+	(see module_simulation.visualization), so the history is kept here
+	compactly even when it is streamed to disk.
+
+	Attributes:
+		path (str): Checkpoint file, replaced by every save.
+		state (Dict[str, Any]): State of the run (as module_batch.setup or load_checkpoint).
+		every (Optional[int]): Iterations between checkpoints, None to only save when asked.
+		iteration (int): Number of iterations of the run so far.
+	'''
+	def __init__(self, path: str, state: Dict[str, Any], every: Optional[int] = None) -> None:
+		if every is not None and every <= 0:
+			raise ValueError("every must be greater than 0")
+		self.path = path
+		self.state = state
+		self.every = every
+		self.iteration = state.get('iteration', 0)
+		self._history = [array('q', values) for values in state.get('history', [[], [], []])]
+
+	def record(self, fire: int, tree: int, rock: int) -> None:
+		'''
+		Add population of the next iteration.
+		'''
+		self.iteration += 1
+		self._history[0].append(fire)
+		self._history[1].append(tree)
+		self._history[2].append(rock)
+
+	def due(self) -> bool:
+		'''
+		Return whether a checkpoint is due after the current iteration.
+		'''
+		return self.every is not None and self.iteration % self.every == 0
+
+	def save(self, patch_arrays: Optional[vectorized.PatchArrays] = None) -> None:
+		'''
+		Save a checkpoint of the current iteration (see save_checkpoint).
+		'''
+		save_checkpoint(self.path, self.state, self.iteration, self._history, patch_arrays)
@@ -1,68 +1,148 @@
 import random
+import threading
 import classes
-from typing import List, Tuple, Dict, Set, Union
+import numpy as np
+from concurrent.futures import Future
+from typing import List, Tuple, Dict, Set, Union, Optional
 import graph_helper as gh
+import module_cache as cache
 import module_user_input as user_input
 import module_file_reader as fr
 
-def generate_random_graph() -> Tuple[List[Tuple[int, int]], Dict[int, Tuple[float, float]]]:
+#Ways to validate that a loaded graph is planar (see validate_planarity)
+PLANARITY_CHECKS = ('check', 'skip', 'defer')
+
+#Deferred planarity checks of graphs read from files (see read_from_file and wait_for_planarity)
+deferred_checks: List[Future] = []
+
+def generate_random_graph(min_site_number: Optional[int] = None,
+						  seed: Optional[int] = None,
+						  rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, Dict[int, Tuple[float, float]]]:
 	'''
-	Retrieve user input for number of nodes and generate a random graph.
+	Generate a random graph with at least min_site_number nodes
+	(retrieved from user input if not given), drawn from rng or seed if
+	given and from the numpy.random global state otherwise.
 
-	returns: edges, pos
+	returns: array of edges with shape (edges, 2), pos
 	'''
-	min_site_number = user_input.site_number()
-	edges, pos = gh.voronoi_to_edges(min_site_number)
-	return edges, pos
+	if min_site_number is None:
+		min_site_number = user_input.site_number()
+	edges, positions = gh.voronoi_graph(min_site_number, seed=seed, rng=rng)
+	return edges, dict(enumerate(map(tuple, positions.tolist())))
 
-def read_from_file() -> Tuple[List[Tuple[int, int]], Dict[int, Tuple[float, float]]]:
+def read_from_file(path: Optional[str] = None, planarity: str = 'check') -> np.ndarray:
 	'''
-	Read edges from file and generate positions for nodes.
+	Read edges from file at path ('-' for standard input, retrieved from
+	user input if not given) and validate that the graph is planar as
+	selected by planarity (see validate_planarity). Deferred checks are kept
+	in deferred_checks until wait_for_planarity. Binary graph files are
+	memory-mapped and checked for planarity on loading.
+
+	Raises ValueError if a given path produces no edges or a non-planar graph.
 
-	returns: edges, pos
+	returns: array of edges with shape (edges, 2)
 	'''
+	if path is not None:
+		edges = fr.read_edges(path)
+		if len(edges) == 0:
+			raise ValueError(f"'{path}' produced no edges")
+		if not isinstance(edges, np.memmap):
+			future = validate_planarity(edges, path, planarity)
+			if future is not None:
+				deferred_checks.append(future)
+		return edges
+
 	while True:
 		try: 
 			# Read edges from file
 			edges = fr.input_file_read()
 
-			# Check if the graph is planar
-			is_planar = gh.edges_planar(edges)
+			# Check if the graph is planar (binary graphs are checked on loading)
+			planar = isinstance(edges, np.memmap) or is_planar(edges)
 			
-			if is_planar:
+			if planar:
 				return edges
 			else:
 				print("The graph defined by the edges is not planar. Please try again.")
 		except Exception:
 			print(f"Error")
 
-def create_color_map(nodes: [Set], fraction_tree: float) -> Dict[int, int]:
+def is_planar(edges: Union[List[Tuple[int, int]], np.ndarray]) -> bool:
+	'''
+	Return whether the graph defined by the edges is planar. Results are
+	cached on disk by a content hash of the edges, so each graph is only
+	checked once.
+	'''
+	key = cache.hash_array(edges)
+	planar = cache.load('planarity', key)
+	if planar is None:
+		planar = gh.edges_planar(edges)
+		cache.store('planarity', key, planar)
+	return planar
+
+def validate_planarity(edges: Union[List[Tuple[int, int]], np.ndarray], source: str,
+					   planarity: str = 'check') -> Optional[Future]:
+	'''
+	Validate that the graph defined by the edges loaded from source is planar.
+	'check' raises ValueError if it is not, 'skip' does not check and
+	'defer' checks in a background thread (so the simulation can start)
+	and prints a warning if it is not.
+
+	returns: Future with the result of a deferred check, otherwise None
+	'''
+	if planarity not in PLANARITY_CHECKS:
+		raise ValueError(f"planarity must be one of {PLANARITY_CHECKS}")
+	message = f"The graph defined by the edges in '{source}' is not planar"
+
+	if planarity == 'check':
+		if not is_planar(edges):
+			raise ValueError(message)
+	elif planarity == 'defer':
+		future = Future()
+		def check() -> None:
+			try:
+				planar = is_planar(edges)
+			except Exception as error:
+				future.set_exception(error)
+				return
+			if not planar:
+				print(f"Warning: {message}")
+			future.set_result(planar)
+		threading.Thread(target=check, daemon=True).start()
+		return future
+
+	return None
+
+def wait_for_planarity() -> bool:
+	'''
+	Wait for the deferred planarity checks of read_from_file, so their
+	warnings are printed before a run finishes.
+
+	returns: whether all graphs that were checked are planar
 	'''
-	Create initial color map for nodes in graph with random colors.
+	planar = True
+	while deferred_checks:
+		planar = deferred_checks.pop(0).result() and planar
+	return planar
+
+def create_color_map(nodes: [Set], fraction_tree: float, rng: random.Random = random) -> Dict[int, int]:
+	'''
+	Create initial color map for nodes in graph with random colors (drawn from rng).
 	
 	returns: dictionary with node id as keys and color values as values
 	'''
-	cmap = {node:random.randint(0, 256) for node in 
-			random.sample(list(nodes),int(fraction_tree*len(nodes)))}
+	cmap = {node:rng.randint(0, 256) for node in 
+			rng.sample(list(nodes),int(fraction_tree*len(nodes)))}
 
 	return cmap
 
-def neighbor_id(edges: List[Tuple[int, int]]) -> Dict[int, List[int]]:
-		'''
-		Return ID of the neighbors to the present patch.
-		'''
-		nodes = unique_nodes(edges)
-
-		neighbor_dict = {}
+def create_adjacency(edges: List[Tuple[int, int]]) -> classes.Adjacency:
+	'''
+	Create compressed adjacency (offsets and neighbor arrays) in one pass over edges.
 
-		for node in nodes:
-			list_of_neighbors = []
-			for edge in edges:
-				if node in edge and edge[0] not in list_of_neighbors and edge[1] not in list_of_neighbors:
-					list_of_neighbors.append(edge[0] if edge[1] == node else edge[1])
-			neighbor_dict[node] = list_of_neighbors
-		
-		return neighbor_dict
+	returns: Adjacency, where adjacency[node] is a zero-copy array of neighbor ids
+	'''
+	return classes.Adjacency(edges)
 
 def unique_nodes(edges: List[Tuple[int,int]]) -> Set[int]:
 	'''
@@ -70,6 +150,9 @@ def unique_nodes(edges: List[Tuple[int,int]]) -> Set[int]:
 
 	returns: set of unique nodes
 	'''
+	if isinstance(edges, np.ndarray):
+		return set(np.unique(edges).tolist())
+
 	#From "edges" list of tuples, extract every integer (node)
 	all_nodes = []
 	for x in edges:
@@ -80,38 +163,59 @@ def unique_nodes(edges: List[Tuple[int,int]]) -> Set[int]:
 	unique_nodes = set(all_nodes)
 	return unique_nodes
 
-def create_land_patches(cmap: Dict[int, int], nodes: Set[int], edges: List[Tuple[int,int]]) -> Dict[int, Union[classes.Treepatch, classes.Rockpatch]]:
+def create_land_patches(cmap: Dict[int, int], nodes: Set[int], edges: List[Tuple[int,int]],
+						adjacency: Optional[classes.Adjacency] = None) -> Dict[int, Union[classes.Treepatch, classes.Rockpatch]]:
 	'''
 	Create land patches (treepatches and rockpatches) with node as id.
+	Neighbors of each patch are slices of the (given or newly created) adjacency.
 
 	returns: dictionary of land patches (objects of class Treepatch or Rockpatch)
 	'''
-	neighbor_dict = neighbor_id(edges)
+	if adjacency is None:
+		adjacency = create_adjacency(edges)
 
-	land_patches = {node:classes.Treepatch(id = node, treestats = cmap[node], neighbors = neighbor_dict[node]) if node in cmap.keys()
-					 else classes.Rockpatch(id = node, neighbors = neighbor_dict[node], fire = False) for node in nodes}
+	land_patches = {node:classes.Treepatch(id = node, treestats = cmap[node], neighbors = adjacency[node]) if node in cmap.keys()
+					 else classes.Rockpatch(id = node, neighbors = adjacency[node], fire = False) for node in nodes}
 	
 	return land_patches
 
-def create_firefighters(nodes: Set[int]) -> Dict[classes.Firefighter, int]:
+def create_firefighters(nodes: Set[int],
+						firefighter_number: Optional[int] = None,
+						firefighter_skill: Optional[float] = None,
+						rng: random.Random = random) -> Dict[classes.Firefighter, int]:
 	'''
-	Create user selected number of firefighters of class Firefighter
+	Create selected number of firefighters of class Firefighter
 	with random starting position.
 	
-	Assign skill from a normal distribution around the user selected level.
+	Assign skill from a normal distribution around the selected level.
+	Number and skill are retrieved from user input if not given.
+	Positions and skills are drawn from rng.
 	
 	returns: Dictionary of firefighters (objects of class Firefighter)
 	'''
-	firefighter_number = user_input.firefighter_number(nodes)
-	firefighter_skill = user_input.firefighter_skill()
-	firefighter_positions = random.sample(list(nodes), firefighter_number)
+	if firefighter_number is None:
+		firefighter_number = user_input.firefighter_number(nodes)
+	if firefighter_skill is None:
+		firefighter_skill = user_input.firefighter_skill()
+	firefighter_positions = rng.sample(list(nodes), firefighter_number)
 	
 	#Create dictionary of firefighters. Values are current position
 	firefighters = {
-		classes.Firefighter(skill=random.gauss(
+		classes.Firefighter(skill=rng.gauss(
 			mu=firefighter_skill, sigma=2.0), position=position): position
 			  for position in firefighter_positions
 			  }
 
 	return firefighters
 
+def create_occupancy(firefighters: Dict[classes.Firefighter, int]) -> Dict[int, List[classes.Firefighter]]:
+	'''
+	Create occupancy index from patch id to the firefighters present there.
+
+	returns: dictionary with patch id as keys and lists of firefighters as values
+	'''
+	occupancy = {}
+	for firefighter in firefighters.keys():
+		occupancy.setdefault(firefighter.position, []).append(firefighter)
+
+	return occupancy
@@ -0,0 +1,269 @@
+"""
+module_domain.py
+
+Domain-decomposed simulation for the Fire Simulation project, for
+landscapes too large for one core. The graph is split into spatial
+subdomains of (almost) equal node counts, and nodes are renumbered so
+every subdomain is a contiguous range. All patch and firefighter state
+lives in shared memory, and one worker process steps each subdomain with
+the rules of module_vectorized.PatchArrays.step. Workers only read the
+fire flags of neighboring patches across subdomain boundaries and the
+positions of firefighters crossing into their subdomain, and a barrier
+separates the three phases of every tick:
+
+	1. firefighters move (from the positions of the previous tick into a second buffer)
+	2. respawn, combustion, damage/healing and burnout of own patches
+	3. fire transmission into own tree patches from burning neighbors and populations are recorded
+
+Fire flags are double buffered: phase 2 writes the flags read by
+transmission and phase 3 writes the flags read by the next tick, so no
+patch is written while a neighbor still reads it.
+
+Fire transmission is pulled by the receiving patch: each pair of a
+burning patch and a neighboring tree patch still transmits with the
+transmission probability, independently, so the results match the
+single-process engines statistically. Each worker draws from its own
+random number stream spawned from the seed, so exact results depend on
+the number of workers.
+
+Usage:
+	python module_domain.py --graph big.fgraph --iterations 100 --workers 8 --seed 1 --output history.csv
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.synchronize
+import os
+import sys
+import numpy as np
+import classes
+import module_batch as batch
+import module_configuration as configuration
+import module_ensemble as ensemble
+import module_random
+import module_reporting as reporting
+import module_vectorized as vectorized
+from typing import List, Tuple, Dict, Any, Optional
+
+def partition(adjacency: classes.Adjacency, parts: int, positions: Optional[np.ndarray] = None) -> np.ndarray:
+	'''
+	Split the nodes of a graph into parts subdomains of (almost) equal node
+	counts. With node positions (in adjacency.nodes order), subdomains are
+	spatial, by recursive bisection at the median of the longer side. Without,
+	nodes are split in breadth-first order from the first node (unreachable
+	nodes last), which also keeps subdomains connected and compact.
+
+	returns: subdomain of each node index
+	'''
+	number_of_nodes = len(adjacency)
+	if parts <= 0:
+		raise ValueError("parts must be greater than 0")
+	domains = np.empty(number_of_nodes, dtype=np.int64)
+
+	if positions is None:
+		source = np.zeros(number_of_nodes, dtype=bool)
+		source[:1] = True
+		distance = vectorized.fire_distance(adjacency, source)
+		distance[distance < 0] = number_of_nodes
+		order = np.argsort(distance, kind='stable')
+		domains[order] = np.arange(number_of_nodes) * parts // max(number_of_nodes, 1)
+		return domains
+
+	positions = np.asarray(positions, dtype=np.float64)
+	pending = [(np.arange(number_of_nodes), 0, parts)]
+	while pending:
+		indices, first, count = pending.pop()
+		if count == 1:
+			domains[indices] = first
+			continue
+
+		#Split the longer side so that both halves get node counts proportional to their parts
+		left = count // 2
+		coordinates = positions[indices]
+		axis = int(np.argmax(np.ptp(coordinates, axis=0))) if len(indices) else 0
+		split = len(indices) * left // count
+		order = np.argpartition(coordinates[:, axis], split) if 0 < split < len(indices) else np.arange(len(indices))
+		pending.append((indices[order[:split]], first, left))
+		pending.append((indices[order[split:]], first + left, count - left))
+
+	return domains
+
+def renumber(adjacency: classes.Adjacency, domains: np.ndarray, parts: int) -> Dict[str, np.ndarray]:
+	'''
+	Renumber nodes so that each of the parts subdomains is a contiguous
+	range of indices (empty if it has no nodes).
+
+	returns: dictionary with order (old index of each new index), bounds
+	(subdomain d holds new indices bounds[d]:bounds[d + 1]), and offsets and
+	neighbor_index of the renumbered CSR adjacency
+	'''
+	order = np.argsort(domains, kind='stable')
+	new_index = np.empty(len(order), dtype=np.int64)
+	new_index[order] = np.arange(len(order))
+	bounds = np.searchsorted(domains[order], np.arange(parts + 1))
+
+	degree = adjacency.degree()[order]
+	offsets = np.zeros(len(order) + 1, dtype=np.int64)
+	np.cumsum(degree, out=offsets[1:])
+	_, neighbors = adjacency.neighbor_pairs(order)
+
+	return {'order': order, 'bounds': bounds, 'offsets': offsets, 'neighbor_index': new_index[neighbors]}
+
+def _run_domain(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]],
+				domain: int,
+				probabilities: Dict[str, float],
+				number_of_iterations: int,
+				seed_sequence: np.random.SeedSequence,
+				barrier: multiprocessing.synchronize.Barrier) -> None:
+	'''
+	Step one subdomain through all iterations (in a worker process), in lockstep with the others.
+	'''
+	try:
+		blocks, arrays = ensemble.attach_arrays(descriptors)
+		rng = module_random.RandomContext(seed_sequence).generator
+		offsets, neighbor_index = arrays['offsets'], arrays['neighbor_index']
+		adjacency = classes.Adjacency.from_arrays(np.arange(len(offsets) - 1), offsets, neighbor_index)
+		first, last = arrays['bounds'][domain], arrays['bounds'][domain + 1]
+		size = last - first
+
+		#Own patches (views into shared memory) and all fire flags for neighbors in other subdomains, after
+		#respawn, combustion, damage/healing and burnout (burning) and after transmission (fire)
+		burning, fire = arrays['fire']
+		tree, treestats = arrays['tree'][first:last], arrays['treestats'][first:last]
+		own_burning, own_fire = burning[first:last], fire[first:last]
+		positions, skills, history = arrays['positions'], arrays['skills'], arrays['history']
+
+		#Neighbor pairs of own patches for transmission: own (local) index and neighbor (global) index
+		receivers = np.repeat(np.arange(size), np.diff(offsets[first:last + 1]))
+		senders = neighbor_index[offsets[first]:offsets[last]]
+
+		for iteration in range(number_of_iterations):
+			current, following = positions[iteration % 2], positions[(iteration + 1) % 2]
+
+			#Move firefighters standing in this subdomain, with the rules of Firefighter.movement
+			present = np.flatnonzero((current >= first) & (current < last))
+			following[present] = vectorized.neighbor_destinations(adjacency, current[present], fire, rng)
+			barrier.wait()
+
+			#Firefighters in this subdomain after moving, and respawn, combustion, damage/healing and burnout
+			present = np.flatnonzero((following >= first) & (following < last))
+			guarded = np.zeros(size, dtype=bool)
+			guarded[following[present] - first] = True
+			skill = np.bincount(following[present] - first, weights=skills[present], minlength=size).astype(np.int64)
+			own_burning[:] = own_fire
+			vectorized.update_patches(tree, treestats, own_burning, guarded, skill, probabilities, rng)
+			barrier.wait()
+
+			#Transmission from burning neighbors (some in other subdomains) to own tree patches
+			pairs = np.flatnonzero(burning[senders])
+			pairs = pairs[tree[receivers[pairs]]]
+			caught = receivers[pairs[rng.random(len(pairs)) < probabilities['transmission']]]
+			own_fire[:] = own_burning
+			own_fire[caught] = True
+			treestats[caught] = 0
+			trees = int(np.count_nonzero(tree))
+			history[iteration, domain] = (np.count_nonzero(own_fire), trees, size - trees)
+			barrier.wait()
+	except BaseException:
+		#Release the other workers instead of leaving them waiting
+		barrier.abort()
+		raise
+
+def run_domains(config: Dict[str, Any], workers: Optional[int] = None) -> Tuple[List[int], List[int], List[int]]:
+	'''
+	Build graph and landscape from config and run the simulation with the
+	graph split into one subdomain per worker process (see the module
+	docstring). Firefighters follow the 'random' dispatch.
+
+	returns: fire_history, tree_history, rock_history
+	'''
+	config = batch.make_config(**config)
+	if config['dispatch'] != 'random':
+		raise ValueError("Domain-decomposed runs only support the 'random' dispatch")
+	if workers is None:
+		workers = os.cpu_count() or 1
+	if workers <= 0:
+		raise ValueError("workers must be greater than 0")
+
+	#Graph, landscape and firefighters as arrays, then one random number stream per worker
+	context = module_random.RandomContext(config['seed'])
+	edges, pos = batch.build_graph(config, context.generator)
+	adjacency = batch.build_adjacency(config, edges)
+	patch_arrays = vectorized.create_patch_arrays(adjacency, config['fraction_tree'], context.generator)
+	firefighter_number = batch.number_of_firefighters(config, len(adjacency))
+	positions = context.generator.choice(len(adjacency), firefighter_number, replace=False)
+	skills = np.trunc(context.generator.normal(config['skill'], 2.0, size=firefighter_number)).astype(np.int64)
+	seed_sequences = context.seed_sequence.spawn(workers)
+
+	coordinates = np.array([pos[int(node)] for node in adjacency.nodes], dtype=np.float64) if pos else None
+	layout = renumber(adjacency, partition(adjacency, workers, coordinates), workers)
+	new_index = np.empty(len(adjacency), dtype=np.int64)
+	new_index[layout['order']] = np.arange(len(adjacency))
+
+	#Firefighter positions and fire flags are double buffered, so phases never overwrite values still being read
+	arrays = {'offsets': layout['offsets'], 'neighbor_index': layout['neighbor_index'], 'bounds': layout['bounds'],
+			  'tree': patch_arrays.tree[layout['order']], 'treestats': patch_arrays.treestats[layout['order']],
+			  'fire': np.repeat(patch_arrays.fire[layout['order']][None, :], 2, axis=0),
+			  'positions': np.repeat(new_index[positions][None, :], 2, axis=0), 'skills': skills,
+			  'history': np.zeros((config['iterations'], workers, 3), dtype=np.int64)}
+	blocks, descriptors = ensemble.share_arrays(arrays)
+
+	#Only the shared copies are kept while the workers run
+	del arrays, layout, new_index, coordinates, patch_arrays, positions, skills, adjacency, edges, pos
+	try:
+		barrier = multiprocessing.Barrier(workers)
+		processes = [multiprocessing.Process(target=_run_domain,
+											 args=(descriptors, domain, config['probabilities'], config['iterations'],
+												   seed_sequences[domain], barrier))
+					 for domain in range(workers)]
+		for process in processes:
+			process.start()
+
+		#A killed worker cannot abort the barrier itself, so the others are stopped as soon as any worker fails
+		running = {process.sentinel: domain for domain, process in enumerate(processes)}
+		while running:
+			for sentinel in multiprocessing.connection.wait(list(running)):
+				domain = running.pop(sentinel)
+				processes[domain].join()
+				if processes[domain].exitcode != 0:
+					barrier.abort()
+					for process in processes:
+						process.terminate()
+						process.join()
+					raise RuntimeError(f"Domain worker {domain} failed with exit code {processes[domain].exitcode}")
+
+		#Populations of all subdomains, read from the shared history
+		history_blocks, history = ensemble.attach_arrays({'history': descriptors['history']})
+		fire_history, tree_history, rock_history = history['history'].sum(axis=1).T.tolist()
+		del history
+		for block in history_blocks:
+			block.close()
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+
+	return fire_history, tree_history, rock_history
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Run a domain-decomposed simulation from command line arguments and write the history.
+	'''
+	parser = batch.make_parser("Run the fire simulation on a large graph split over worker processes.")
+	parser.add_argument('--workers', type=int, help="Number of worker processes and subdomains (default: number of cores)")
+
+	arguments = parser.parse_args(argv)
+	overrides = batch.parse_overrides(argv, parser)
+	batch.reject_options(parser, overrides, ('vectorized',))
+	config = batch.make_config(**overrides)
+	config.pop('workers', None)
+	if config['dispatch'] != 'random':
+		parser.error(f"--dispatch {config['dispatch']} is not supported, domain-decomposed runs use the random dispatch")
+
+	fire_history, tree_history, rock_history = run_domains(config, arguments.workers)
+	configuration.wait_for_planarity()
+	reporting.write_history(config['output'], fire_history, tree_history, rock_history)
+	print(f"Wrote {len(fire_history)} iterations to {config['output']}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
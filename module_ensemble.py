@@ -0,0 +1,237 @@
+"""
+module_ensemble.py
+
+Monte Carlo ensemble runner for the Fire Simulation project.
+The graph (edges, adjacency and node positions) is built once and placed
+in shared memory. Replicates run with the vectorized engine in a process
+pool, each with an independent random number stream spawned from one
+seed, and their fire/tree/rock histories are aggregated.
+
+Usage:
+	python module_ensemble.py --graph cnfg/graph6.dat --replicates 1000 --seed 1 --output ensemble.npz
+"""
+
+import os
+import sys
+import numpy as np
+import classes
+import module_batch as batch
+import module_configuration as configuration
+import module_random
+import module_simulation as simulation
+import module_vectorized as vectorized
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Tuple, Dict, Any, Optional, Sequence, Union
+
+#Populations recorded for each replicate, in history array order
+POPULATIONS = ('fire', 'tree', 'rock')
+
+#Graph and run parameters of the current worker process (set by _init_worker)
+_worker: Dict[str, Any] = {}
+
+def graph_arrays(edges: List[Tuple[int, int]],
+				 pos: Optional[Dict[int, Tuple[float, float]]] = None,
+				 adjacency: Optional[classes.Adjacency] = None) -> Dict[str, np.ndarray]:
+	'''
+	Create the arrays describing the graph: edges, CSR adjacency (created
+	if not given) and node positions (in adjacency.nodes order, empty if
+	not available).
+
+	returns: dictionary of arrays
+	'''
+	if adjacency is None:
+		adjacency = configuration.create_adjacency(edges)
+	positions = (np.array([pos[int(node)] for node in adjacency.nodes], dtype=np.float64)
+				 if pos else np.empty((0, 2), dtype=np.float64))
+
+	return {'edges': np.asarray(edges, dtype=np.int64).reshape(-1, 2),
+			'nodes': adjacency.nodes,
+			'offsets': adjacency.offsets,
+			'neighbor_index': adjacency.neighbor_index,
+			'positions': positions}
+
+def share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, Tuple[str, Tuple[int, ...], str]]]:
+	'''
+	Copy arrays into shared memory blocks.
+
+	returns: blocks (to close and unlink when done), descriptors (name, shape, dtype) for attach_arrays
+	'''
+	blocks = []
+	descriptors = {}
+	for key, array in arrays.items():
+		block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+		np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+		blocks.append(block)
+		descriptors[key] = (block.name, array.shape, array.dtype.str)
+
+	return blocks, descriptors
+
+def attach_arrays(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, np.ndarray]]:
+	'''
+	Attach to shared memory blocks created by share_arrays, without copying.
+
+	returns: blocks (must stay referenced while the arrays are used), arrays
+	'''
+	blocks = []
+	arrays = {}
+	for key, (name, shape, dtype) in descriptors.items():
+		block = shared_memory.SharedMemory(name=name)
+		blocks.append(block)
+		arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+	return blocks, arrays
+
+def _init_worker(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]], config: Dict[str, Any]) -> None:
+	'''
+	Attach worker process to the shared graph.
+	'''
+	blocks, arrays = attach_arrays(descriptors)
+	_worker['blocks'] = blocks
+	_worker['arrays'] = arrays
+	_worker['adjacency'] = classes.Adjacency.from_arrays(arrays['nodes'], arrays['offsets'], arrays['neighbor_index'])
+	_worker['config'] = config
+
+def _run_replicate(seed_sequence: np.random.SeedSequence) -> np.ndarray:
+	'''
+	Run one replicate on the shared graph with its own random number context.
+
+	returns: history array of shape (3, iterations) with fire, tree and rock counts
+	'''
+	return run_replicate(_worker['adjacency'], _worker['config'], seed_sequence)
+
+def replicate_seed_sequence(seed: Union[None, int, np.random.SeedSequence], replicate: int) -> np.random.SeedSequence:
+	'''
+	Return the seed sequence of a replicate of a run_ensemble with seed,
+	without creating the ones before it.
+	'''
+	#Children after the two spawned by RandomContext for graph generation
+	seed_sequence = module_random.RandomContext(seed).seed_sequence
+	return np.random.SeedSequence(seed_sequence.entropy,
+								  spawn_key=seed_sequence.spawn_key + (seed_sequence.n_children_spawned + replicate,))
+
+def run_replicate(adjacency: classes.Adjacency, config: Dict[str, Any], seed_sequence: np.random.SeedSequence) -> np.ndarray:
+	'''
+	Run one replicate with the vectorized engine on a graph, with landscape,
+	firefighters and every iteration drawn from the random number context of seed_sequence.
+
+	returns: history array of shape (3, iterations) with fire, tree and rock counts
+	'''
+	rng = module_random.RandomContext(seed_sequence).generator
+
+	patch_arrays = vectorized.create_patch_arrays(adjacency, config['fraction_tree'], rng)
+	firefighters = vectorized.create_firefighters(adjacency, batch.number_of_firefighters(config, len(adjacency)),
+												  config['skill'], rng)
+
+	histories = simulation.run_vectorized(patch_arrays, config['probabilities'], firefighters, config['iterations'],
+										  config['dispatch'])
+
+	return np.array(histories, dtype=np.int64)
+
+def summarize(histories: np.ndarray, quantiles: Sequence[float] = (0.05, 0.5, 0.95)) -> Dict[str, Dict[str, np.ndarray]]:
+	'''
+	Aggregate replicate histories of shape (replicates, 3, iterations).
+
+	returns: for each population ('fire', 'tree', 'rock') a dictionary with
+	'mean' (iterations), 'quantiles' (len(quantiles), iterations) and
+	'replicates' (replicates, iterations)
+	'''
+	summary = {}
+	for i, population in enumerate(POPULATIONS):
+		replicates = histories[:, i, :]
+		summary[population] = {'mean': replicates.mean(axis=0),
+							   'quantiles': np.quantile(replicates, quantiles, axis=0),
+							   'replicates': replicates}
+
+	return summary
+
+def run_ensemble(config: Dict[str, Any],
+				 replicates: int,
+				 workers: Optional[int] = None,
+				 quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+				 batched: bool = False) -> Dict[str, Dict[str, np.ndarray]]:
+	'''
+	Build the graph once, run replicates in a process pool and aggregate
+	their population histories (see summarize). If batched is True, all
+	replicates instead run together in this process as one
+	vectorized.ReplicaPatchArrays (faster for small graphs, with memory
+	for replicates × nodes patches), drawing from one random number stream.
+
+	returns: summary dictionary
+	'''
+	config = batch.make_config(**config)
+	if replicates <= 0:
+		raise ValueError("replicates must be greater than 0")
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	#Graph generation and the replicate contexts are derived from the same seed,
+	#so results do not depend on the number of workers
+	context = module_random.RandomContext(config['seed'])
+	edges, pos = batch.build_graph(config, context.generator)
+
+	if batched:
+		adjacency = batch.build_adjacency(config, edges)
+		rng = context.spawn(1)[0].generator
+		replica_arrays = vectorized.create_replica_arrays(adjacency, replicates, config['fraction_tree'],
+														  batch.number_of_firefighters(config, len(adjacency)),
+														  config['skill'], rng)
+		histories = simulation.run_replicas(replica_arrays, config['probabilities'], config['iterations'],
+											config['dispatch'])
+		summary = summarize(histories, quantiles)
+		summary['quantile_levels'] = np.asarray(quantiles)
+		return summary
+
+	seed_sequences = context.seed_sequence.spawn(replicates)
+
+	blocks, descriptors = share_arrays(graph_arrays(edges, pos, batch.build_adjacency(config, edges)))
+	try:
+		with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+								 initargs=(descriptors, config)) as executor:
+			chunksize = max(1, replicates // (4*workers))
+			histories = np.stack(list(executor.map(_run_replicate, seed_sequences, chunksize=chunksize)))
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+
+	summary = summarize(histories, quantiles)
+	summary['quantile_levels'] = np.asarray(quantiles)
+	return summary
+
+def write_ensemble(path: str, summary: Dict[str, Any]) -> None:
+	'''
+	Write ensemble summary (means, quantiles and per-replicate histories) to an .npz file.
+	'''
+	arrays = {'quantile_levels': summary['quantile_levels']}
+	for population in POPULATIONS:
+		for key, array in summary[population].items():
+			arrays[f"{population}_{key}"] = array
+
+	np.savez_compressed(path, **arrays)
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Run an ensemble from command line arguments and write the summary.
+	'''
+	parser = batch.make_parser("Run replicates of the fire simulation in parallel and aggregate their histories.")
+	parser.add_argument('--replicates', type=int, default=100, help="Number of replicates")
+	parser.add_argument('--workers', type=int, help="Number of worker processes (default: number of cores)")
+	parser.add_argument('--batched', action='store_true', help="Run all replicates together as arrays in one process")
+	parser.set_defaults(output='ensemble.npz')
+
+	arguments = parser.parse_args(argv)
+	replicates, workers = arguments.replicates, arguments.workers
+	overrides = batch.parse_overrides(argv, parser)
+	batch.reject_options(parser, overrides, ('vectorized',))
+	config = batch.make_config(**overrides)
+	for name in ('replicates', 'workers', 'batched'):
+		config.pop(name, None)
+
+	summary = run_ensemble(config, replicates, workers, batched=arguments.batched)
+	configuration.wait_for_planarity()
+	write_ensemble(config['output'], summary)
+	print(f"Wrote {replicates} replicates to {config['output']}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -1,36 +1,112 @@
-from typing import List, Tuple
+import io
+import sys
+import warnings
+import itertools
+import numpy as np
+from typing import Union, Iterable, Iterator, BinaryIO
 
-def input_file_read() -> List[Tuple[int,int]]:
+def _parse_block(block: bytes) -> np.ndarray:
+	'''
+	Parse a block of whole lines into a flat array of node ids with NumPy,
+	skipping empty lines and comments (from '#' to the end of the line).
+
+	Raises ValueError if any other line is not two integers separated by ','.
+	'''
+	#A block of only empty lines and comments is not an error
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore', UserWarning)
+		edges = np.loadtxt(io.BytesIO(block), dtype=np.int64, delimiter=',', comments='#', ndmin=2)
+	if len(edges) and edges.shape[1] != 2:
+		raise ValueError(f"Edge lines must hold two node ids, not {edges.shape[1]}")
+	return edges.reshape(-1)
+
+def read_blocks(filestream: BinaryIO, block_size: int = 1 << 24) -> Iterator[bytes]:
+	'''
+	Read a binary file in blocks of about block_size bytes, each ending at a line break.
+	'''
+	rest = b''
+	while True:
+		data = filestream.read(block_size)
+		if not data:
+			break
+		data = rest + data
+		end = data.rfind(b'\n') + 1
+		block, rest = data[:end], data[end:]
+		if block:
+			yield block
+	if rest:
+		yield rest
+
+def parse_blocks(blocks: Iterable[bytes]) -> np.ndarray:
+	'''
+	Create edge array from blocks of whole lines. Empty lines and comments
+	(from '#' to the end of the line) are skipped. No tuple is created per line.
+
+	Raises ValueError for lines without exactly two integer values.
+
+	Returns:
+	Array of edges with shape (edges, 2)
+	'''
+	chunks = [_parse_block(block) for block in blocks]
+	if not chunks:
+		return np.empty((0, 2), dtype=np.int64)
+	return np.concatenate(chunks).reshape(-1, 2)
+
+def parse_edges(lines: Iterable[str], chunk_size: int = 1 << 18) -> np.ndarray:
+	'''
+	Create edge array from lines of text (with or without line breaks),
+	chunk_size lines at a time, see parse_blocks.
+
+	Returns:
+	Array of edges with shape (edges, 2)
+	'''
+	lines = iter(lines)
+	chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+	return parse_blocks('\n'.join(line.rstrip('\r\n') for line in chunk).encode() for chunk in chunks)
+
+def read_edges(source: Union[str, Iterable[str]] = '-') -> np.ndarray:
+	'''
+	Create edge array from source: a file path, '-' for standard input or
+	an iterable of lines (e.g. an open file or a generator). Files are
+	parsed in blocks, see parse_blocks. Binary graph files (see
+	module_binary_graph) are memory-mapped instead.
+
+	Returns:
+	Array of edges with shape (edges, 2)
+	'''
+	if not isinstance(source, str):
+		return parse_edges(source)
+	if source == '-':
+		return parse_blocks(read_blocks(sys.stdin.buffer))
+
+	import module_binary_graph as binary_graph
+	if binary_graph.is_binary_graph(source):
+		return binary_graph.read_edges(source)
+
+	with open(source, 'rb') as filestream:
+		return parse_blocks(read_blocks(filestream))
+
+def input_file_read() -> np.ndarray:
 	'''
 	Create list of edges from a file located in a user-defined location.
 
 	Returns:
-	List of edges
+	Array of edges with shape (edges, 2)
 	'''
 	while True:
 		try:
-			#Create empty list
-			edges = []
-			
 			path = input("""Input system data file location: """).strip()
 
 			#Read file and create list of edges
-			with open(path, 'r') as filestream:
-				for line in filestream:
-					line = line.strip()
-					if line and not line.startswith('#'): #Checks if the line is empty and if the line starts with a '#'.
-						line =  line.split(',') #Splits line into parts when it encounters ','. Returns list of strings
-						if len(line) == 2 and all(line):
-							edge = tuple(map(int, line)) #Converts each list into a tuple. Map converts each element of the list to an int.
-							edges.append(edge) #Appends tuple to list
+			edges = read_edges(path)
 
 			#Check if edges list is empty. If yes, skip rest of while loop and start over.
-			if not edges:
+			if len(edges) == 0:
 				print(f"Chosen file produced no edges. Is the file the correct format? Or is it empty?")
 				continue
 
 			return edges
-		
+
 		except FileNotFoundError:
 			print(f"File was not found. Enter a valid file path.")
 
@@ -38,4 +114,4 @@ def input_file_read() -> List[Tuple[int,int]]:
 			print(f"File could not be read. Try another file format.")
 
 		except Exception:
-			print(f'An error has occured. Beaware that the number of points must be larger than 3')
\ No newline at end of file
+			print(f'An error has occured. Beaware that the number of points must be larger than 3')
@@ -0,0 +1,137 @@
+"""
+module_layout.py
+
+Node layouts for graphs without positions (e.g. loaded from file) for
+the Fire Simulation project. Small graphs use the spring layout of
+networkx, as the Visualiser always did. Large graphs use a pivot MDS
+layout computed from breadth-first search distances, which scales to
+millions of nodes. Layouts are cached on disk by a hash of the edges,
+so reopening a landscape does not compute its layout again.
+"""
+
+import numpy as np
+import classes
+import module_cache as cache
+from typing import List, Tuple, Dict, Union
+
+#Available layouts; 'auto' uses 'spring' up to SPRING_LIMIT nodes and 'mds' above
+LAYOUTS = ('auto', 'spring', 'mds')
+SPRING_LIMIT = 2000
+
+#Number of pivot nodes of the 'mds' layout
+PIVOTS = 32
+
+def spring_layout(adjacency: classes.Adjacency) -> np.ndarray:
+	'''
+	Force-directed layout of networkx (O(N^2) per iteration).
+
+	returns: positions of shape (nodes, 2) in adjacency.nodes order
+	'''
+	import networkx as nx
+
+	graph = nx.Graph()
+	graph.add_nodes_from(range(len(adjacency)))
+	graph.add_edges_from(zip(adjacency.sources().tolist(), adjacency.neighbor_index.tolist()))
+	pos = nx.spring_layout(graph, k=2)
+	return np.array([pos[i] for i in range(len(adjacency))], dtype=np.float64).reshape(-1, 2)
+
+def mds_layout(adjacency: classes.Adjacency) -> np.ndarray:
+	'''
+	Pivot MDS layout (Brandes and Pich): breadth-first search distances
+	from up to PIVOTS pivot nodes, each chosen farthest from the previous
+	ones, are embedded by classical multidimensional scaling, computed per
+	connected component. Cost grows linearly with the size of the graph.
+	Components are placed on a grid, scaled by their size.
+
+	returns: positions of shape (nodes, 2) in adjacency.nodes order, within [0, 1] x [0, 1]
+	'''
+	from scipy import sparse
+	from scipy.sparse.csgraph import connected_components
+
+	number_of_nodes = len(adjacency)
+	matrix = sparse.csr_matrix((np.ones(len(adjacency.neighbor_index), dtype=np.int8), adjacency.neighbor_index, adjacency.offsets),
+							   shape=(number_of_nodes, number_of_nodes))
+	number_of_components, labels = connected_components(matrix, directed=False)
+
+	#Nodes of each component, largest component first
+	order = np.argsort(labels, kind='stable')
+	sizes = np.bincount(labels, minlength=number_of_components)
+	components = np.split(order, np.cumsum(sizes)[:-1])
+	components.sort(key=len, reverse=True)
+
+	positions = np.zeros((number_of_nodes, 2), dtype=np.float64)
+	columns = int(np.ceil(np.sqrt(number_of_components)))
+	largest = len(components[0]) if components else 1
+	for i, nodes in enumerate(components):
+		if len(nodes) <= 3:
+			#Too small to embed, place on a line
+			component = np.stack([np.linspace(0.0, 1.0, len(nodes) + 2)[1:-1], np.full(len(nodes), 0.5)], axis=1)
+		else:
+			component = _pivot_mds(matrix if len(nodes) == number_of_nodes else matrix[nodes][:, nodes])
+			component = component - component.min(axis=0)
+			component = component / max(component.max(), 1e-12)
+
+		#Place in its grid cell, scaled by its size relative to the largest component
+		scale = np.sqrt(len(nodes) / largest)
+		positions[nodes] = (component * scale + [i % columns, i // columns]) / columns
+
+	return positions
+
+def _pivot_mds(matrix: 'sparse.csr_matrix') -> np.ndarray:
+	'''
+	Pivot MDS of a connected graph given by its adjacency matrix.
+
+	returns: positions of shape (nodes, 2)
+	'''
+	from scipy.sparse.csgraph import shortest_path
+
+	number_of_nodes = matrix.shape[0]
+	number_of_pivots = min(PIVOTS, number_of_nodes)
+	squared = np.empty((number_of_nodes, number_of_pivots), dtype=np.float32)
+	nearest = np.full(number_of_nodes, np.inf)
+	pivot = 0
+	for j in range(number_of_pivots):
+		distances = shortest_path(matrix, directed=False, unweighted=True, indices=pivot)
+		squared[:, j] = distances**2
+		np.minimum(nearest, distances, out=nearest)
+		pivot = int(np.argmax(nearest))
+
+	#Double centering of the squared distances, then project onto the two main axes
+	centered = squared - squared.mean(axis=0)
+	centered -= centered.mean(axis=1, keepdims=True)
+	centered *= -0.5
+	values, vectors = np.linalg.eigh((centered.T @ centered).astype(np.float64))
+	return centered @ vectors[:, [-1, -2]].astype(np.float32)
+
+def compute_layout(edges: Union[List[Tuple[int, int]], np.ndarray], method: str = 'auto') -> Dict[int, Tuple[float, float]]:
+	'''
+	Compute node positions of the graph defined by the edges.
+
+	returns: dictionary of node positions
+	'''
+	if method not in LAYOUTS:
+		raise ValueError(f"Unknown layout '{method}', choose one of {LAYOUTS}")
+
+	adjacency = classes.Adjacency(edges)
+	if method == 'auto':
+		method = 'spring' if len(adjacency) <= SPRING_LIMIT else 'mds'
+	positions = spring_layout(adjacency) if method == 'spring' else mds_layout(adjacency)
+
+	return dict(zip(adjacency.nodes.tolist(), map(tuple, positions.tolist())))
+
+def cached_layout(edges: Union[List[Tuple[int, int]], np.ndarray], method: str = 'auto') -> Dict[int, Tuple[float, float]]:
+	'''
+	Same as compute_layout, with layouts cached on disk by a hash of the
+	edges (see module_cache), so each landscape is only laid out once.
+
+	returns: dictionary of node positions
+	'''
+	key = f"{cache.hash_array(edges)}-{method}"
+	arrays = cache.load_arrays('layout', key)
+	if arrays is not None:
+		return dict(zip(arrays['nodes'].tolist(), map(tuple, arrays['positions'].tolist())))
+
+	pos = compute_layout(edges, method)
+	cache.store_arrays('layout', key, nodes=np.fromiter(pos.keys(), dtype=np.int64, count=len(pos)),
+					   positions=np.array(list(pos.values()), dtype=np.float64).reshape(-1, 2))
+	return pos
@@ -0,0 +1,77 @@
+"""
+module_random.py
+
+Random number streams for the Fire Simulation project. A RandomContext
+derives every random number generator of one run from a single seed,
+so runs are reproducible without touching the global state of the
+random and numpy.random modules, and spawns statistically independent
+child contexts for parallel workers.
+"""
+
+import random
+import numpy as np
+from typing import Any, Dict, List, Union
+
+class RandomContext:
+	'''
+	Random number generators of one simulation run, derived from one seed sequence.
+
+	Attributes:
+		seed_sequence (np.random.SeedSequence): Source of all streams of this context.
+		generator (np.random.Generator): Used by graph generation and the array engines.
+		random (random.Random): Used by landscape and firefighter creation and the object
+			engine (same interface as the random module).
+	'''
+	def __init__(self, seed: Union[None, int, np.random.SeedSequence] = None) -> None:
+		self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+		#One independent child sequence per generator
+		numpy_sequence, python_sequence = self.seed_sequence.spawn(2)
+		self.generator = np.random.default_rng(numpy_sequence)
+		self.random = random.Random(int.from_bytes(python_sequence.generate_state(4).tobytes(), 'little'))
+
+	def spawn(self, number: int) -> List['RandomContext']:
+		'''
+		Create independent child contexts, e.g. one per worker or replicate.
+		Children are the same on every run with the same seed.
+
+		returns: list of RandomContext
+		'''
+		return [RandomContext(seed_sequence) for seed_sequence in self.seed_sequence.spawn(number)]
+
+	def get_state(self) -> Dict[str, Any]:
+		'''
+		Return the state of the context (seed sequence and both generators)
+		as a JSON serializable dictionary, e.g. for checkpoints.
+
+		returns: dictionary for from_state
+		'''
+		return {'entropy': self.seed_sequence.entropy,
+				'spawn_key': list(self.seed_sequence.spawn_key),
+				'children_spawned': self.seed_sequence.n_children_spawned,
+				'generator': self.generator.bit_generator.state,
+				'random': self.random.getstate()}
+
+	@classmethod
+	def from_state(cls, state: Dict[str, Any]) -> 'RandomContext':
+		'''
+		Create a context continuing exactly where the context of get_state was,
+		including the child contexts it spawns next.
+
+		returns: RandomContext
+		'''
+		context = cls.__new__(cls)
+		context.seed_sequence = np.random.SeedSequence(state['entropy'], spawn_key=tuple(state['spawn_key']),
+													   n_children_spawned=state['children_spawned'])
+
+		bit_generator = getattr(np.random, state['generator']['bit_generator'])()
+		bit_generator.state = state['generator']
+		context.generator = np.random.Generator(bit_generator)
+
+		version, internal_state, gauss_next = state['random']
+		context.random = random.Random()
+		context.random.setstate((version, tuple(internal_state), gauss_next))
+		return context
+
+	def __repr__(self) -> str:
+		return f"RandomContext(entropy={self.seed_sequence.entropy}, spawn_key={self.seed_sequence.spawn_key})"
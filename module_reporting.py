@@ -1,5 +1,6 @@
-from typing import List
-import matplotlib.pyplot as plt
+import csv
+import numpy as np
+from typing import List, Dict, Any, Sequence
 
 def static_graph(
 		number_of_iterations: int,
@@ -10,6 +11,8 @@ def static_graph(
 	'''
 	Visualize population history from simulation.
 	'''
+	import matplotlib.pyplot as plt
+
 	# Create x-axis values (iterations)
 	iterations = list(range(1, number_of_iterations + 1))
 
@@ -27,4 +30,100 @@ def static_graph(
 	plt.legend()
 
 	# Show the plot
-	plt.show()
\ No newline at end of file
+	plt.show()
+
+def write_history(
+		path: str,
+		fire_history: List[int],
+		tree_history: List[int],
+		rock_history: List[int]
+		) -> None:
+	'''
+	Write population history from simulation to a CSV file
+	with one row per iteration.
+	'''
+	with open(path, 'w', newline='') as filestream:
+		writer = csv.writer(filestream)
+		writer.writerow(['iteration', 'fire', 'tree', 'rock'])
+		writer.writerows(zip(range(1, len(fire_history) + 1), fire_history, tree_history, rock_history))
+
+def write_scenarios(path: str, histories: Sequence[np.ndarray]) -> None:
+	'''
+	Write population histories of several scenarios (arrays of shape
+	(3, iterations) with fire, tree and rock counts) to one CSV file
+	with one row per scenario and iteration.
+	'''
+	with open(path, 'w', newline='') as filestream:
+		writer = csv.writer(filestream)
+		writer.writerow(['scenario', 'iteration', 'fire', 'tree', 'rock'])
+		for scenario, history in enumerate(histories):
+			fire_history, tree_history, rock_history = np.asarray(history).tolist()
+			writer.writerows((scenario, iteration, fire, tree, rock) for iteration, fire, tree, rock
+							 in zip(range(1, len(fire_history) + 1), fire_history, tree_history, rock_history))
+
+def write_sweep(path: str, points: Sequence[Dict[str, Any]], histories: np.ndarray) -> None:
+	'''
+	Write population histories of a parameter sweep (array of shape
+	(points, replicates, 3, iterations), see module_sweep.run_sweep) to one
+	CSV file with one row per point, replicate and iteration, and one
+	column per swept parameter.
+	'''
+	parameters = list(dict.fromkeys(name for point in points for name in point))
+	with open(path, 'w', newline='') as filestream:
+		writer = csv.writer(filestream)
+		writer.writerow(['point', 'replicate', *parameters, 'iteration', 'fire', 'tree', 'rock'])
+		for number, (point, replicates) in enumerate(zip(points, np.asarray(histories).tolist())):
+			values = [point.get(name) for name in parameters]
+			for replicate, (fire_history, tree_history, rock_history) in enumerate(replicates):
+				writer.writerows((number, replicate, *values, iteration, fire, tree, rock) for iteration, fire, tree, rock
+								 in zip(range(1, len(fire_history) + 1), fire_history, tree_history, rock_history))
+
+class HistoryWriter:
+	'''
+	Streams population history to a CSV file (same format as write_history)
+	in chunks, so memory use does not grow with the number of iterations.
+
+	Attributes:
+		path (str): CSV file written to.
+		chunk_size (int): Number of iterations buffered before writing to disk.
+		iterations (int): Number of iterations appended so far.
+	'''
+	def __init__(self, path: str, chunk_size: int = 10000) -> None:
+		self.path = path
+		self.chunk_size = chunk_size
+		self.iterations = 0
+		self._rows = []
+		self._filestream = open(path, 'w', newline='')
+		self._writer = csv.writer(self._filestream)
+		self._writer.writerow(['iteration', 'fire', 'tree', 'rock'])
+
+	def append(self, fire: int, tree: int, rock: int) -> None:
+		'''
+		Add population of the next iteration, writing the buffered chunk when full.
+		'''
+		self.iterations += 1
+		self._rows.append((self.iterations, fire, tree, rock))
+		if len(self._rows) >= self.chunk_size:
+			self.flush()
+
+	def flush(self) -> None:
+		'''
+		Write buffered iterations to disk.
+		'''
+		self._writer.writerows(self._rows)
+		self._rows.clear()
+		self._filestream.flush()
+
+	def close(self) -> None:
+		'''
+		Write remaining iterations and close the file.
+		'''
+		if not self._filestream.closed:
+			self.flush()
+			self._filestream.close()
+
+	def __enter__(self) -> 'HistoryWriter':
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
@@ -1,21 +1,71 @@
+import math
+import random
 import classes
-import visualiser_random_forest_graph as vr
-from typing import List, Tuple, Dict, Union
+import numpy as np
+import module_configuration as configuration
+import module_random
+import module_reporting as reporting
+import module_timing as timing
+import module_vectorized as vectorized
+from typing import List, Tuple, Dict, Set, Union, Optional, TYPE_CHECKING
+
+#Only needed for type hints, so headless runs never import matplotlib
+if TYPE_CHECKING:
+	import visualiser_random_forest_graph as vr
+	import module_checkpoint as checkpoint
+
+#Available engines for updating land patches each iteration
+ENGINES = ('objects', 'vectorized', 'frontier')
 
 def visualization(
-		graph: vr.Visualiser,
+		graph: Optional['vr.Visualiser'],
 		edges: List[Tuple[int, int]],
 		probabilities: Dict[str, float],
 		firefighters: Dict[classes.Firefighter, int],
 		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
 		cmap: Dict[int, int],
-		number_of_iterations: int
+		number_of_iterations: int,
+		engine: str = 'objects',
+		adjacency: Optional[classes.Adjacency] = None,
+		rng: Optional[module_random.RandomContext] = None,
+		render_every: int = 1,
+		history: Optional[reporting.HistoryWriter] = None,
+		checkpoints: Optional['checkpoint.CheckpointWriter'] = None,
+		timer: Optional[timing.PhaseTimer] = None,
+		dispatch: str = 'random'
 		) -> Tuple[List[int], List[int], List[int]]:
 	'''
 	Visualize the simulation and return the population history.
+	If graph is None, the simulation runs without visualization,
+	otherwise the graph is drawn every render_every iterations (and
+	after the last one). Frame pacing is set on the Visualiser.
+	If history is given, the population history is streamed to it
+	instead of kept in memory, and the returned lists are empty.
+	If checkpoints is given, checkpoints are saved when due and after
+	the last iteration. If timer is given, the phases of every tick are
+	timed (see module_timing). Firefighters move with the rules of
+	Firefighter.movement if dispatch is 'random', and all at once towards
+	the nearest fire if dispatch is 'distance' (see
+	vectorized.FirefighterDispatch, which draws from the array generator
+	with every engine).
+
+	The 'objects' engine updates each Treepatch and Rockpatch in turn,
+	the 'vectorized' engine updates all patches at once as NumPy arrays
+	(reusing adjacency when given) and the 'frontier' engine only
+	updates patches near fire or firefighters. The array engines only
+	update the color map for drawn iterations and at the end of the run.
+	Every random draw comes from rng if given (the generator of the
+	array engines, the random.Random of the object engine) and from
+	unseeded or global generators otherwise.
 
 	returns: fire_history, tree_history, rock_history
 	'''
+	if engine not in ENGINES:
+		raise ValueError(f"Unknown engine '{engine}', choose one of {ENGINES}")
+	if dispatch not in vectorized.DISPATCHES:
+		raise ValueError(f"Unknown dispatch '{dispatch}', choose one of {vectorized.DISPATCHES}")
+	if render_every < 1:
+		raise ValueError("render_every must be at least 1")
 	
 	#initialize iteration count
 	iteration = 1
@@ -25,109 +75,429 @@ def visualization(
 	tree_history = []
 	rock_history = []
 
+	generator = rng.generator if rng is not None else None
+	random_state = rng.random if rng is not None else random
+
+	#Store land patches as arrays for the array engines
+	if engine == 'vectorized':
+		patch_arrays = vectorized.PatchArrays(land_patches, adjacency, generator)
+	elif engine == 'frontier':
+		patch_arrays = vectorized.FrontierPatchArrays(land_patches, adjacency, generator)
+	#Index firefighters by position and count populations once for the object engine
+	else:
+		occupancy = configuration.create_occupancy(firefighters)
+		population = count_population(land_patches)
+
+	#Distance field dispatch shares the adjacency of the array engines
+	firefighter_dispatch = None
+	if dispatch == 'distance':
+		if engine != 'objects':
+			adjacency = patch_arrays.adjacency
+		elif adjacency is None:
+			adjacency = configuration.create_adjacency(edges)
+		firefighter_dispatch = vectorized.FirefighterDispatch(adjacency, generator)
+
 	#Run simulation
-	while graph.is_open() and iteration <= number_of_iterations:
+	while (graph is None or graph.is_open()) and iteration <= number_of_iterations:
+		#Draw every render_every iterations and the last one
+		render = graph is not None and ((iteration - 1) % render_every == 0 or iteration == number_of_iterations)
 		iteration += 1
-		update(edges,
-				probabilities,
-				graph,
+		if engine != 'objects':
+			update_vectorized(probabilities,
+					graph,
+					firefighters,
+					patch_arrays,
+					cmap if render else None,
+					fire_history,
+					tree_history,
+					rock_history,
+					render,
+					timer,
+					firefighter_dispatch)
+		else:
+			update(edges,
+					probabilities,
+					graph,
+					firefighters,
+					land_patches,
+					cmap,
+					fire_history,
+					tree_history,
+					rock_history,
+					occupancy,
+					render,
+					population,
+					random_state,
+					timer,
+					firefighter_dispatch)
+
+		#Save the full state when a checkpoint is due
+		if checkpoints is not None:
+			checkpoints.record(fire_history[-1], tree_history[-1], rock_history[-1])
+			if checkpoints.due() or iteration > number_of_iterations:
+				checkpoints.save(patch_arrays if engine != 'objects' else None)
+			if timer is not None:
+				timer.lap('checkpoint')
+
+		#Stream population history to disk instead of keeping it in memory
+		if history is not None:
+			history.append(fire_history.pop(), tree_history.pop(), rock_history.pop())
+			if timer is not None:
+				timer.lap('stream')
+
+	if graph is not None:
+		graph.close()
+	if engine != 'objects':
+		patch_arrays.update_color_map(cmap)
+
+	return fire_history, tree_history, rock_history
+
+def run(
+		edges: List[Tuple[int, int]],
+		probabilities: Dict[str, float],
+		firefighters: Dict[classes.Firefighter, int],
+		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
+		cmap: Dict[int, int],
+		number_of_iterations: int,
+		engine: str = 'objects',
+		adjacency: Optional[classes.Adjacency] = None,
+		rng: Optional[module_random.RandomContext] = None,
+		history: Optional[reporting.HistoryWriter] = None,
+		checkpoints: Optional['checkpoint.CheckpointWriter'] = None,
+		timer: Optional[timing.PhaseTimer] = None,
+		dispatch: str = 'random'
+		) -> Tuple[List[int], List[int], List[int]]:
+	'''
+	Run the simulation without visualization and return the population
+	history (empty lists if it is streamed to history), saving checkpoints
+	and timing phases if given, with firefighters moved by dispatch.
+
+	returns: fire_history, tree_history, rock_history
+	'''
+	return visualization(None, edges, probabilities, firefighters, land_patches, cmap, number_of_iterations,
+						 engine, adjacency, rng, history=history, checkpoints=checkpoints, timer=timer,
+						 dispatch=dispatch)
+
+def run_vectorized(
+		patch_arrays: vectorized.PatchArrays,
+		probabilities: Dict[str, float],
+		firefighters: Dict[classes.Firefighter, int],
+		number_of_iterations: int,
+		dispatch: str = 'random'
+		) -> Tuple[List[int], List[int], List[int]]:
+	'''
+	Run the simulation on existing patch arrays without visualization
+	or color map, and return the population history. Firefighters are
+	moved by dispatch (see visualization).
+
+	returns: fire_history, tree_history, rock_history
+	'''
+	fire_history = []
+	tree_history = []
+	rock_history = []
+
+	firefighter_dispatch = None
+	if dispatch == 'distance':
+		firefighter_dispatch = vectorized.FirefighterDispatch(patch_arrays.adjacency, patch_arrays.rng)
+	elif dispatch not in vectorized.DISPATCHES:
+		raise ValueError(f"Unknown dispatch '{dispatch}', choose one of {vectorized.DISPATCHES}")
+
+	for _ in range(number_of_iterations):
+		update_vectorized(probabilities,
+				None,
 				firefighters,
-				land_patches,
-				cmap,
+				patch_arrays,
+				None,
 				fire_history,
 				tree_history,
-				rock_history)
-	graph.close()
+				rock_history,
+				dispatch=firefighter_dispatch)
 
 	return fire_history, tree_history, rock_history
 
+def run_replicas(
+		replica_arrays: vectorized.ReplicaPatchArrays,
+		probabilities: Dict[str, float],
+		number_of_iterations: int,
+		dispatch: str = 'random'
+		) -> np.ndarray:
+	'''
+	Run all replicas of replica_arrays together, with firefighters moved
+	by dispatch (see visualization), and return their population histories.
+
+	returns: history array of shape (replicas, 3, iterations) with the fire,
+	tree and rock counts of each replica (e.g. module_reporting.static_graph(iterations, *histories[replica]))
+	'''
+	firefighter_dispatch = None
+	if dispatch == 'distance':
+		firefighter_dispatch = vectorized.FirefighterDispatch(replica_arrays.adjacency, replica_arrays.rng)
+	elif dispatch not in vectorized.DISPATCHES:
+		raise ValueError(f"Unknown dispatch '{dispatch}', choose one of {vectorized.DISPATCHES}")
+
+	histories = np.zeros((replica_arrays.replicas, 3, number_of_iterations), dtype=np.int64)
+	for iteration in range(number_of_iterations):
+		replica_arrays.move_firefighters(firefighter_dispatch)
+		replica_arrays.step(probabilities)
+		for population, counts in enumerate(replica_arrays.population()):
+			histories[:, population, iteration] = counts
+
+	return histories
+
 def update(
 		edges: List[Tuple[int, int]],
 		probabilities: Dict[str, float],
-		graph: vr.Visualiser,
+		graph: Optional['vr.Visualiser'],
 		firefighters: Dict[classes.Firefighter, int],
 		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
 		cmap: Dict[int, int],
 		fire_history: List[int],
 		tree_history: List[int],
-		rock_history: List[int]
+		rock_history: List[int],
+		occupancy: Optional[Dict[int, List[classes.Firefighter]]] = None,
+		render: bool = True,
+		population: Optional[Dict[str, int]] = None,
+		rng: random.Random = random,
+		timer: Optional[timing.PhaseTimer] = None,
+		dispatch: Optional[vectorized.FirefighterDispatch] = None
 		) -> None:
 	'''
 	Update firefighter positions, tree patch health, fire spread,
 	rock to tree conversions, tree to rock conversions, and color map.
+	Occupancy (patch id to firefighters present) is created if not given
+	and kept up to date otherwise, and so are the population counters
+	(see count_population). The graph is only drawn if render is True.
+	Random draws come from rng. Each update is a tick of timer (if given).
+	Firefighters are moved by dispatch if given (see move_firefighters).
 
 	Returns: None
 	'''
+	if timer is not None:
+		timer.tick()
+	if occupancy is None:
+		occupancy = configuration.create_occupancy(firefighters)
+
 	#Move firefighters
-	move_firefighters(firefighters, land_patches)
+	move_firefighters(firefighters, land_patches, occupancy, rng, dispatch)
+	if timer is not None:
+		timer.lap('movement')
 
 	#Update land_patches
-	update_land_patches(land_patches, probabilities, cmap, firefighters)
+	update_land_patches(land_patches, probabilities, cmap, occupancy, population, rng)
+	if timer is not None:
+		timer.lap('land')
 
 	#Store population history for static graph
-	population_history(land_patches, fire_history, tree_history, rock_history)
+	population_history(land_patches, fire_history, tree_history, rock_history, population)
+	if timer is not None:
+		timer.lap('history')
 
 	#Update cmap
 	update_color_map(land_patches, cmap)
+	if timer is not None:
+		timer.lap('color_map')
+
+	#Update graph color and firefighter positions
+	if graph is not None and render:
+		graph.update(cmap, [firefighter.position for firefighter in firefighters.keys()])
+		if timer is not None:
+			timer.lap('render')
+
+def update_vectorized(
+		probabilities: Dict[str, float],
+		graph: Optional['vr.Visualiser'],
+		firefighters: Dict[classes.Firefighter, int],
+		patch_arrays: vectorized.PatchArrays,
+		cmap: Optional[Dict[int, int]],
+		fire_history: List[int],
+		tree_history: List[int],
+		rock_history: List[int],
+		render: bool = True,
+		timer: Optional[timing.PhaseTimer] = None,
+		dispatch: Optional[vectorized.FirefighterDispatch] = None
+		) -> None:
+	'''
+	Same as update, but with land patches stored and updated as arrays
+	(PatchArrays or FrontierPatchArrays). The color map is not kept up to date if cmap is None.
+
+	Returns: None
+	'''
+	if timer is not None:
+		timer.tick()
+
+	#Move firefighters
+	patch_arrays.move_firefighters(firefighters, dispatch)
+	if timer is not None:
+		timer.lap('movement')
+
+	#Update land patches
+	patch_arrays.step(probabilities, firefighters)
+	if timer is not None:
+		timer.lap('land')
+
+	#Store population history for static graph
+	fire, tree, rock = patch_arrays.population()
+	fire_history.append(fire)
+	tree_history.append(tree)
+	rock_history.append(rock)
+	if timer is not None:
+		timer.lap('history')
+
+	#Update cmap
+	if cmap is not None:
+		patch_arrays.update_color_map(cmap)
+		if timer is not None:
+			timer.lap('color_map')
 
 	#Update graph color and firefighter positions
-	graph.update_node_colours(cmap)
-	graph.update_node_edges([firefighter.position for firefighter in firefighters.keys()])
+	if graph is not None and render:
+		graph.update(cmap, [firefighter.position for firefighter in firefighters.keys()])
+		if timer is not None:
+			timer.lap('render')
 
 def move_firefighters(
 		firefighters: Dict[classes.Firefighter, int],
-		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]]
+		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
+		occupancy: Optional[Dict[int, List[classes.Firefighter]]] = None,
+		rng: random.Random = random,
+		dispatch: Optional[vectorized.FirefighterDispatch] = None
 		) -> None:
 	'''
-	Move firefighter positions and return an updated firefighter dictionary.
+	Move firefighter positions (drawn from rng) and update the firefighter
+	dictionary and occupancy index (if given). If dispatch is given, all
+	firefighters move at once towards the nearest fire instead.
 
 	Returns: None
 	'''
-	for firefighter in firefighters.keys():
-		firefighter.movement(land_patches)
-		firefighters[firefighter] = firefighter.position
+	if dispatch is not None:
+		previous_positions = [firefighter.position for firefighter in firefighters.keys()]
+		fire = np.array([land_patches[node].fire is True for node in dispatch.adjacency.nodes.tolist()], dtype=bool)
+		dispatch.move(firefighters, fire)
+	else:
+		previous_positions = None
+
+	for number, firefighter in enumerate(firefighters.keys()):
+		if previous_positions is None:
+			previous_position = firefighter.position
+			firefighter.movement(land_patches, rng)
+			firefighters[firefighter] = firefighter.position
+		else:
+			previous_position = previous_positions[number]
+
+		#Move firefighter between positions in occupancy index
+		if occupancy is not None and firefighter.position != previous_position:
+			occupancy[previous_position].remove(firefighter)
+			if not occupancy[previous_position]:
+				del occupancy[previous_position]
+			occupancy.setdefault(firefighter.position, []).append(firefighter)
 
 def update_land_patches(
 		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
 		probabilities: Dict[str, float],
 		cmap: Dict[int, int],
-		firefighters: Dict[classes.Firefighter, int]
+		occupancy: Dict[int, List[classes.Firefighter]],
+		population: Optional[Dict[str, int]] = None,
+		rng: random.Random = random
 		) -> None:
 	'''
-	Update land patches and color map.
+	Update land patches and color map. Occupancy maps patch ids
+	to the firefighters present there. Population counters (if given)
+	are updated with every ignition, extinction, burn out and respawn.
+	Random draws come from rng.
 
 	returns: None
 	'''
+	#Draw which patches respawn or combust this iteration (positions in land_patches)
+	respawns = sample_events(len(land_patches), probabilities['respawn'], rng)
+	ignitions = sample_events(len(land_patches), probabilities['combustion'], rng)
+
 	# Update land_patches
-	for patch in land_patches.values():
+	for position, patch in enumerate(list(land_patches.values())):
 		#Update rock to tree conversions
 		if isinstance(patch, classes.Rockpatch):
-			patch.mutate(land_patches, probabilities, cmap)
+			if position in respawns:
+				patch.respawn(land_patches, cmap, rng)
+				if population is not None:
+					population['rock'] -= 1
+					population['tree'] += 1
 		elif isinstance(patch, classes.Treepatch):
+			burning = patch.fire
 			#Update spontaneous combustion
-			patch.combustion(probabilities)
+			if position in ignitions:
+				patch.ignite()
 			#Update treestats
-			patch.updateland(firefighters, land_patches, cmap)
+			patch.updateland(occupancy, land_patches, cmap)
 			#Update colors
 			cmap[patch.id] = patch.treestats
 			#Update fire spread
+			ignited = 0
 			if patch.fire is True:
-				patch.transmission(probabilities)
+				ignited = patch.transmission(probabilities, land_patches, rng)
+			#Update population counters (the patch turns into a Rockpatch if it burned out)
+			if population is not None:
+				population['fire'] += int(patch.fire) - int(burning) + ignited
+				if isinstance(patch, classes.Rockpatch):
+					population['tree'] -= 1
+					population['rock'] += 1
+
+def sample_events(number: int, probability: float, rng: random.Random = random) -> Set[int]:
+	'''
+	Return positions in range(number) at which an event with the given
+	probability happens, with the same distribution as one random draw per
+	position. Gaps between events are drawn (from rng) from the geometric
+	distribution, so the number of random draws scales with the number of events.
+
+	returns: set of positions
+	'''
+	if probability <= 0.0:
+		return set()
+	if probability >= 1.0:
+		return set(range(number))
+
+	events = set()
+	log_miss = math.log(1.0 - probability)
+	position = int(math.log(1.0 - rng.random()) / log_miss)
+	while position < number:
+		events.add(position)
+		position += 1 + int(math.log(1.0 - rng.random()) / log_miss)
+
+	return events
 
 def population_history(
 		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
 		fire_history: List[int],
 		tree_history: List[int],
-		rock_history: List[int]
+		rock_history: List[int],
+		population: Optional[Dict[str, int]] = None
 		) -> None:
 	'''
-	Add current population to population history lists.
+	Add current population to population history lists, from the
+	population counters if given and by counting land patches otherwise.
 
 	Returns: None
 	'''
-	fire_history.append(len([1 for element in land_patches.values() if isinstance(element, classes.Treepatch) and element.fire is True]))
-	tree_history.append(len([1 for element in land_patches.values() if isinstance(element, classes.Treepatch)]))
-	rock_history.append(len([1 for element in land_patches.values() if isinstance(element, classes.Rockpatch)]))
+	if population is None:
+		population = count_population(land_patches)
+
+	fire_history.append(population['fire'])
+	tree_history.append(population['tree'])
+	rock_history.append(population['rock'])
+
+def count_population(land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]]) -> Dict[str, int]:
+	'''
+	Count patches on fire, tree patches and rock patches.
+
+	returns: dictionary with 'fire', 'tree' and 'rock' counts
+	'''
+	population = {'fire': 0, 'tree': 0, 'rock': 0}
+	for patch in land_patches.values():
+		if isinstance(patch, classes.Treepatch):
+			population['tree'] += 1
+			if patch.fire is True:
+				population['fire'] += 1
+		elif isinstance(patch, classes.Rockpatch):
+			population['rock'] += 1
+
+	return population
 
 def update_color_map(
 		land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
@@ -0,0 +1,238 @@
+"""
+module_sweep.py
+
+Parameter sweeps for the Fire Simulation project. A sweep expands a grid
+(every combination of given values) or a random design (scrambled Halton
+sequence over given ranges) of run parameters and runs replicates of every point
+in a process pool, on one graph built from the seed and shared as in
+module_ensemble. Every (graph, parameters, seed, replicate) result is
+cached on disk (see module_cache), so an interrupted or extended sweep
+only runs the missing points. The histories of all points are written to
+one tidy CSV table.
+
+Usage:
+	python module_sweep.py --graph cnfg/graph6.dat --grid grid.json --replicates 10 --seed 1 --output sweep.csv
+	python module_sweep.py --ranges ranges.json --points 200 --seed 1
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import sys
+import numpy as np
+import classes
+import module_batch as batch
+import module_configuration as configuration
+import module_cache as cache
+import module_ensemble as ensemble
+import module_random
+import module_reporting as reporting
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, Sequence
+
+#Parameters that can be swept (probabilities by name, the others as in module_batch.DEFAULTS)
+PARAMETERS = ('combustion', 'transmission', 'respawn', 'fraction_tree', 'firefighters', 'skill')
+PROBABILITIES = ('combustion', 'transmission', 'respawn')
+
+#Parameters drawn as whole numbers in random designs
+INTEGER_PARAMETERS = ('firefighters',)
+
+#Run parameters that change the result of a point, part of its cache key
+RESULT_KEYS = ('probabilities', 'fraction_tree', 'firefighters', 'skill', 'iterations', 'dispatch')
+
+#Version of the simulation results, part of every cache key (change when results of a point change)
+VERSION = 1
+
+#Shared graph of the current worker process (set by _init_worker)
+_worker: Dict[str, Any] = {}
+
+def _check_parameters(names: Sequence[str]) -> None:
+	unknown = set(names) - set(PARAMETERS)
+	if unknown:
+		raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}, choose from {PARAMETERS}")
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+	'''
+	Expand a grid of parameter values into every combination of them.
+
+	returns: list of points (dictionaries of parameter values)
+	'''
+	_check_parameters(grid.keys())
+	names = list(grid.keys())
+
+	return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def random_design(ranges: Dict[str, Tuple[float, float]], points: int,
+				  seed: Optional[int] = None) -> List[Dict[str, Any]]:
+	'''
+	Draw points from (low, high) ranges of parameters as the first points
+	of a scrambled Halton sequence (scrambled by seed), which fills the
+	ranges evenly at every length. Designs with more points extend designs
+	with fewer points of the same ranges (in the same order) and seed, so
+	their cached results are reused.
+
+	returns: list of points (dictionaries of parameter values)
+	'''
+	from scipy.stats import qmc
+
+	_check_parameters(ranges.keys())
+	if points <= 0:
+		raise ValueError("points must be greater than 0")
+	sample = qmc.Halton(len(ranges), scramble=True, rng=np.random.default_rng(seed)).random(points)
+
+	values = {}
+	for dimension, (name, (low, high)) in enumerate(ranges.items()):
+		values[name] = low + sample[:, dimension]*(high - low)
+		if name in INTEGER_PARAMETERS:
+			values[name] = np.round(values[name]).astype(np.int64)
+
+	return [{name: values[name][point].item() for name in ranges} for point in range(points)]
+
+def point_config(config: Dict[str, Any], point: Dict[str, Any]) -> Dict[str, Any]:
+	'''
+	Apply the parameters of a point to run parameters.
+
+	returns: dictionary of parameters (validated, see module_batch.make_config)
+	'''
+	probabilities = {**config['probabilities'], **{name: value for name, value in point.items() if name in PROBABILITIES}}
+	return batch.make_config(**{**config, **{name: value for name, value in point.items() if name not in PROBABILITIES},
+								'probabilities': probabilities})
+
+def result_key(graph_hash: str, config: Dict[str, Any], replicate: int) -> str:
+	'''
+	Return cache key of a replicate of a point: a hash of the graph, the
+	parameters that change its result, the seed and the replicate.
+	'''
+	identity = {'version': VERSION, 'graph': graph_hash, 'seed': config['seed'], 'replicate': replicate,
+				'parameters': {key: config[key] for key in RESULT_KEYS}}
+	return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+def _init_worker(descriptors: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> None:
+	'''
+	Attach worker process to the shared graph.
+	'''
+	blocks, arrays = ensemble.attach_arrays(descriptors)
+	_worker['blocks'] = blocks
+	_worker['adjacency'] = classes.Adjacency.from_arrays(arrays['nodes'], arrays['offsets'], arrays['neighbor_index'])
+
+def _run_point(task: Tuple[str, Dict[str, Any], int]) -> np.ndarray:
+	'''
+	Run a replicate of a point on the shared graph and cache its history.
+
+	returns: history array of shape (3, iterations) with fire, tree and rock counts
+	'''
+	key, config, replicate = task
+	history = ensemble.run_replicate(_worker['adjacency'], config,
+									 ensemble.replicate_seed_sequence(config['seed'], replicate))
+	cache.store_arrays('sweep', key, history=history)
+
+	return history
+
+def run_sweep(config: Dict[str, Any],
+			  points: List[Dict[str, Any]],
+			  replicates: int = 1,
+			  workers: Optional[int] = None) -> np.ndarray:
+	'''
+	Run replicates of every point (parameters changed from config) with the
+	vectorized engine, on the graph of config, in a process pool. Replicate
+	r of every point uses the random number stream of replicate r of
+	module_ensemble.run_ensemble with the same seed, so points are compared
+	on the same landscapes as far as their parameters allow. Cached results
+	are reused and new ones are cached as soon as they are done.
+
+	Raises ValueError if config has no seed, as results could not be reused,
+	or if a point has more firefighters than the graph has nodes.
+
+	returns: history array of shape (points, replicates, 3, iterations)
+	'''
+	config = batch.make_config(**config)
+	if config['seed'] is None:
+		raise ValueError("A sweep needs a seed")
+	if replicates <= 0:
+		raise ValueError("replicates must be greater than 0")
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	#The graph comes from the same seed as in module_ensemble
+	edges, _ = batch.build_graph(config, module_random.RandomContext(config['seed']).generator)
+	graph_hash = cache.hash_array(edges)
+	adjacency = batch.build_adjacency(config, edges)
+
+	#Points are checked before any run, so a sweep never stops halfway on an invalid point
+	configs = [point_config(config, point) for point in points]
+	for point, point_configuration in zip(points, configs):
+		try:
+			batch.number_of_firefighters(point_configuration, len(adjacency))
+		except ValueError as error:
+			raise ValueError(f"Point {point}: {error}") from error
+
+	histories = np.zeros((len(points), replicates, 3, config['iterations']), dtype=np.int64)
+	tasks = []
+	for number, point in enumerate(configs):
+		for replicate in range(replicates):
+			key = result_key(graph_hash, point, replicate)
+			cached = cache.load_arrays('sweep', key)
+			if cached is not None and cached['history'].shape == histories.shape[2:]:
+				histories[number, replicate] = cached['history']
+			else:
+				tasks.append((number, replicate, key))
+	print(f"{len(points)*replicates - len(tasks)} of {len(points)*replicates} results cached")
+	if not tasks:
+		return histories
+
+	blocks, descriptors = ensemble.share_arrays(ensemble.graph_arrays(edges, None, adjacency))
+	try:
+		with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(descriptors,)) as executor:
+			chunksize = max(1, len(tasks) // (4*workers))
+			results = executor.map(_run_point, [(key, configs[number], replicate) for number, replicate, key in tasks],
+								   chunksize=chunksize)
+			for (number, replicate, _), history in zip(tasks, results):
+				histories[number, replicate] = history
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+
+	return histories
+
+def main(argv: Optional[List[str]] = None) -> None:
+	'''
+	Run a sweep from command line arguments and write the results table.
+	'''
+	parser = batch.make_parser("Run the fire simulation for a grid or random design of parameters.")
+	parser.add_argument('--grid', help="JSON file with a list of values for each swept parameter")
+	parser.add_argument('--ranges', help="JSON file with a [low, high] range for each swept parameter")
+	parser.add_argument('--points', type=int, default=100, help="Number of points drawn from --ranges")
+	parser.add_argument('--replicates', type=int, default=1, help="Number of replicates of every point")
+	parser.add_argument('--workers', type=int, help="Number of worker processes (default: number of cores)")
+	parser.set_defaults(output='sweep.csv')
+
+	arguments = parser.parse_args(argv)
+	if (arguments.grid is None) == (arguments.ranges is None):
+		parser.error("give either --grid or --ranges")
+	overrides = batch.parse_overrides(argv, parser)
+	batch.reject_options(parser, overrides, ('vectorized',))
+	config = batch.make_config(**overrides)
+	for name in ('grid', 'ranges', 'points', 'replicates', 'workers'):
+		config.pop(name, None)
+
+	#Unseeded sweeps get a random seed, printed so they can be extended later
+	if config['seed'] is None:
+		config['seed'] = np.random.SeedSequence().entropy
+		print(f"Seed: {config['seed']}")
+
+	with open(arguments.grid or arguments.ranges, 'r') as filestream:
+		design = json.load(filestream)
+	if arguments.grid is not None:
+		points = expand_grid(design)
+	else:
+		points = random_design(design, arguments.points, config['seed'])
+
+	histories = run_sweep(config, points, arguments.replicates, arguments.workers)
+	configuration.wait_for_planarity()
+	reporting.write_sweep(config['output'], points, histories)
+	print(f"Wrote {len(points)} points of {arguments.replicates} replicates to {config['output']}")
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
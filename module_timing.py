@@ -0,0 +1,111 @@
+"""
+module_timing.py
+
+Per-phase timing of simulation ticks for the Fire Simulation project.
+A PhaseTimer passed to module_simulation.update (or visualization, run
+and module_batch.run_state) records wall time and call counts of each
+phase of a tick: firefighter movement, land update, history bookkeeping,
+color map update, rendering, and checkpoints and history streaming.
+Results are available as a summary table and as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev). Without a timer, the
+simulation only pays one comparison per phase.
+"""
+
+import json
+import time
+from typing import List, Dict, Any
+
+class PhaseTimer:
+	'''
+	Records the time between laps of each tick under the name of the phase that ended.
+
+	Attributes:
+		ticks (int): Number of ticks started.
+		totals (Dict[str, float]): Total seconds of each phase.
+		calls (Dict[str, int]): Number of laps of each phase.
+		events (Optional[List[Tuple[str, float, float, int]]]): Phase, start, duration
+			and tick of every lap if trace is True (grows with the run), otherwise None.
+	'''
+	def __init__(self, trace: bool = False) -> None:
+		self.ticks = 0
+		self.totals = {}
+		self.calls = {}
+		self.events = [] if trace else None
+		self._origin = time.perf_counter()
+		self._last = self._origin
+
+	def tick(self) -> None:
+		'''
+		Start a tick. The first phase of the tick is timed from here.
+		'''
+		self.ticks += 1
+		self._last = time.perf_counter()
+
+	def lap(self, phase: str) -> None:
+		'''
+		End phase: add the time since the start of the tick or the previous lap.
+		'''
+		now = time.perf_counter()
+		duration = now - self._last
+		if phase in self.totals:
+			self.totals[phase] += duration
+			self.calls[phase] += 1
+		else:
+			self.totals[phase] = duration
+			self.calls[phase] = 1
+		if self.events is not None:
+			self.events.append((phase, self._last - self._origin, duration, self.ticks))
+		self._last = now
+
+	def summary(self) -> List[Dict[str, Any]]:
+		'''
+		Summarize phases, slowest first.
+
+		returns: list of rows with phase, calls, total (seconds), mean (seconds
+		per call), per_tick (seconds per tick) and share (of the total time)
+		'''
+		overall = sum(self.totals.values()) or 1.0
+		return [{'phase': phase, 'calls': self.calls[phase], 'total': total, 'mean': total / self.calls[phase],
+				 'per_tick': total / max(self.ticks, 1), 'share': total / overall}
+				for phase, total in sorted(self.totals.items(), key=lambda item: item[1], reverse=True)]
+
+	def format_summary(self) -> str:
+		'''
+		Format summary as a table.
+		'''
+		lines = [f"{'phase':<12}{'calls':>10}{'total s':>12}{'mean ms':>12}{'ms/tick':>12}{'share':>8}"]
+		for row in self.summary():
+			lines.append(f"{row['phase']:<12}{row['calls']:>10}{row['total']:12.4f}{row['mean']*1e3:12.4f}"
+						 f"{row['per_tick']*1e3:12.4f}{row['share']:8.1%}")
+		lines.append(f"{self.ticks} ticks, {sum(self.totals.values()):.4f} s")
+
+		return '\n'.join(lines)
+
+	def chrome_trace(self) -> Dict[str, Any]:
+		'''
+		Return recorded laps in Chrome trace event format: one complete event per
+		phase, nested in one event per tick (times in microseconds).
+
+		Raises ValueError if the timer was created without trace.
+		'''
+		if self.events is None:
+			raise ValueError("PhaseTimer was created without trace")
+
+		events = []
+		ticks = {}
+		for phase, start, duration, tick in self.events:
+			events.append({'name': phase, 'cat': 'phase', 'ph': 'X', 'ts': start*1e6, 'dur': duration*1e6,
+						   'pid': 0, 'tid': 0, 'args': {'tick': tick}})
+			first, last = ticks.get(tick, (start, start + duration))
+			ticks[tick] = (min(first, start), max(last, start + duration))
+		events.extend({'name': 'tick', 'cat': 'tick', 'ph': 'X', 'ts': first*1e6, 'dur': (last - first)*1e6,
+					   'pid': 0, 'tid': 0, 'args': {'tick': tick}} for tick, (first, last) in ticks.items())
+
+		return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+	def write_trace(self, path: str) -> None:
+		'''
+		Write the Chrome trace (see chrome_trace) to a JSON file.
+		'''
+		with open(path, 'w') as filestream:
+			json.dump(self.chrome_trace(), filestream)
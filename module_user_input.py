@@ -169,3 +169,27 @@ def probabilities(default_combustion: float = 0.1,
 		
 		except ValueError:
 			print("Please enter valid float probabilities between 0 and 1")
+
+
+def engine(default: str = 'objects') -> str:
+	'''Ask user for desired simulation engine'''
+	engines = {1: 'objects', 2: 'vectorized', 3: 'frontier'}
+	while True:
+		try:
+			user_input_engine = input("""Which simulation engine do you want?
+			1. Object based
+			2. Vectorized (faster on large landscapes)
+			3. Active frontier (faster when few patches burn)
+			Make choice (default = 1) """).strip()
+
+			if user_input_engine == "":
+				return default
+
+			choice = int(user_input_engine)
+
+			if choice in engines:
+				return engines[choice]
+			print(f"'{user_input_engine}' not recognized, please enter a number that corresponds to one of the options displayed.\n")
+
+		except ValueError:
+			print(f"'{user_input_engine}' not recognized, please enter a number that corresponds to one of the options displayed.\n")
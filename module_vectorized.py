@@ -0,0 +1,724 @@
+import numpy as np
+import classes
+from typing import Tuple, Dict, Union, Optional
+
+#Ways to move firefighters each tick: 'random' moves each firefighter to a random
+#neighbor on fire, or any neighbor if none is (Firefighter.movement), 'distance'
+#moves all firefighters one step towards the nearest fire (see FirefighterDispatch)
+DISPATCHES = ('random', 'distance')
+
+def sample_events(rng: np.random.Generator, number: int, probability: float) -> np.ndarray:
+	'''
+	Return sorted indices in range(number) at which an event with the given
+	probability happens, with the same distribution as one independent draw
+	per index. Gaps between events are drawn from the geometric distribution,
+	so the number of random draws scales with the number of events.
+
+	returns: array of indices
+	'''
+	if probability <= 0.0 or number == 0:
+		return np.empty(0, dtype=np.int64)
+	if probability >= 1.0:
+		return np.arange(number, dtype=np.int64)
+
+	#Draw gaps in batches a little larger than the expected number of events
+	expected = number*probability
+	batch = int(expected + 4*np.sqrt(expected)) + 16
+	events = []
+	position = -1
+	while position < number:
+		positions = position + np.cumsum(rng.geometric(probability, size=batch))
+		events.append(positions[positions < number])
+		position = positions[-1]
+
+	return np.concatenate(events)
+
+def neighbor_pairs(adjacency: classes.Adjacency, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	'''
+	Return neighbors of patches given as flat indices into arrays of shape
+	(..., patches), e.g. one row per replica: every neighbor is in the same
+	row as its patch.
+
+	returns: counts (number of neighbors of each patch), targets (flat
+	indices of the neighbors, grouped by patch)
+	'''
+	nodes = indices % len(adjacency) if len(adjacency) else indices
+	counts = adjacency.offsets[nodes + 1] - adjacency.offsets[nodes]
+	_, targets = adjacency.neighbor_pairs(nodes)
+
+	return counts, targets + np.repeat(indices - nodes, counts)
+
+def choose_pairs(counts: np.ndarray, candidates: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+	'''
+	Choose one of the consecutive pairs of each owner (counts pairs each,
+	at least one) at random among its candidates, or among all its pairs if
+	it has no candidate, for all owners at once.
+
+	returns: index of the chosen pair of each owner
+	'''
+	ends = np.cumsum(counts)
+	starts = ends - counts
+
+	#Number of candidates before each pair, so the k-th candidate of an owner is found by bisection
+	candidate_total = np.cumsum(candidates, dtype=np.int64)
+	before = candidate_total[starts] - candidates[starts]
+	number = candidate_total[ends - 1] - before
+
+	choice = (rng.random(len(counts)) * np.where(number > 0, number, counts)).astype(np.int64)
+	return np.where(number > 0, np.searchsorted(candidate_total, before + choice + 1), starts + choice)
+
+def fire_distance(adjacency: classes.Adjacency, fire: np.ndarray) -> np.ndarray:
+	'''
+	Multi-source breadth-first search from all burning patches, one
+	frontier of the graph at a time, in O(nodes + edges). Fire flags of
+	shape (replicas, patches) give one independent search per replica.
+
+	returns: number of steps from each patch (adjacency.nodes order, same
+	shape as fire) to the nearest burning patch, -1 where no fire is reachable
+	'''
+	distance = np.full(fire.size, -1, dtype=np.int64)
+	frontier = np.flatnonzero(fire)
+	distance[frontier] = 0
+	level = 0
+
+	#Position of the last occurrence of each patch in targets, to drop duplicates without sorting
+	last = np.empty(fire.size, dtype=np.int64)
+	while len(frontier):
+		level += 1
+		_, targets = neighbor_pairs(adjacency, frontier)
+		targets = targets[distance[targets] < 0]
+		distance[targets] = level
+		order = np.arange(len(targets))
+		last[targets] = order
+		frontier = targets[last[targets] == order]
+
+	return distance.reshape(fire.shape)
+
+def neighbor_destinations(adjacency: classes.Adjacency, positions: np.ndarray, fire: np.ndarray,
+						  rng: np.random.Generator) -> np.ndarray:
+	'''
+	Apply the rules of Firefighter.movement to many firefighters at once:
+	stay on a burning patch, otherwise move to a random neighbor on fire, or
+	to any neighbor if none is. Positions are flat indices into fire (shape
+	(..., patches)), so firefighters of several replicas move together.
+
+	returns: array of new positions
+	'''
+	fire = fire.reshape(-1)
+	destinations = np.array(positions, dtype=np.int64)
+	counts, _ = neighbor_pairs(adjacency, destinations)
+	moving = np.flatnonzero(~fire[destinations] & (counts > 0))
+	if len(moving) == 0:
+		return destinations
+
+	counts, targets = neighbor_pairs(adjacency, destinations[moving])
+	destinations[moving] = targets[choose_pairs(counts, fire[targets], rng)]
+
+	return destinations
+
+class FirefighterDispatch:
+	'''
+	Moves all firefighters at once along the distance field to the fire
+	(see fire_distance), computed once per tick, so the cost per tick does
+	not grow with the number of firefighters beyond one array operation.
+
+	Firefighters on a burning patch stay. Others move to a random neighbor
+	one step closer to the nearest fire (which is a neighbor on fire if
+	there is one, as in Firefighter.movement), or to a random neighbor if no
+	fire can be reached.
+
+	Attributes:
+		adjacency (classes.Adjacency): Graph adjacency; array index i is patch adjacency.nodes[i].
+		rng (np.random.Generator): Random number generator used to choose between neighbors.
+	'''
+	def __init__(self, adjacency: classes.Adjacency, rng: Optional[np.random.Generator] = None) -> None:
+		self.adjacency = adjacency
+		self.rng = rng if rng is not None else np.random.default_rng()
+
+	def destinations(self, positions: np.ndarray, fire: np.ndarray) -> np.ndarray:
+		'''
+		Return the next patch index of firefighters at positions, given fire
+		flags in adjacency.nodes order. With fire flags of shape (replicas,
+		patches), positions are flat indices and firefighters only follow the
+		fire of their own replica.
+
+		returns: array of patch indices
+		'''
+		destinations = np.array(positions, dtype=np.int64)
+		counts, _ = neighbor_pairs(self.adjacency, destinations)
+		moving = np.flatnonzero(~fire.reshape(-1)[destinations] & (counts > 0))
+		if len(moving) == 0:
+			return destinations
+
+		distance = fire_distance(self.adjacency, fire).reshape(-1)
+		starts = destinations[moving]
+		counts, targets = neighbor_pairs(self.adjacency, starts)
+
+		#Neighbors one step closer to fire (none if no fire is reachable, so any neighbor is chosen)
+		closer = distance[targets] == np.repeat(distance[starts], counts) - 1
+		destinations[moving] = targets[choose_pairs(counts, closer, self.rng)]
+
+		return destinations
+
+	def move(self, firefighters: Dict[classes.Firefighter, int], fire: np.ndarray) -> None:
+		'''
+		Move firefighters (updating their positions and the firefighter
+		dictionary), given fire flags in adjacency.nodes order.
+		'''
+		positions = self.adjacency.indices_of([firefighter.position for firefighter in firefighters.keys()])
+		destinations = self.adjacency.nodes[self.destinations(positions, fire)].tolist()
+		for firefighter, position in zip(firefighters.keys(), destinations):
+			firefighter.position = position
+			firefighters[firefighter] = position
+
+class PatchArrays:
+	'''
+	Array-backed state of all land patches, stepped with batched
+	NumPy operations instead of one method call per patch object.
+
+	Follows the rules of the Treepatch and Rockpatch classes. All patches
+	are updated from the same start-of-tick state, so a tree caught by
+	transmission is first damaged on the following tick.
+
+	Attributes:
+		adjacency (classes.Adjacency): Graph adjacency; array index i is patch adjacency.nodes[i].
+		ids (np.ndarray): Patch id for each array index.
+		tree (np.ndarray): True for tree patches, False for rock patches.
+		treestats (np.ndarray): Tree health and color (unused for rock patches).
+		fire (np.ndarray): True for patches on fire.
+		sources (np.ndarray): Patch index of each directed neighbor pair.
+		targets (np.ndarray): Neighbor index of each directed neighbor pair.
+		rng (np.random.Generator): Random number generator used for every draw.
+	'''
+	def __init__(self,
+				 land_patches: Dict[int, Union[classes.Treepatch, classes.Landpatch]],
+				 adjacency: Optional[classes.Adjacency] = None,
+				 rng: Optional[np.random.Generator] = None) -> None:
+
+		#Rebuild adjacency from the neighbors of each patch if not given
+		if adjacency is None:
+			adjacency = classes.Adjacency([(patch.id, neighbor) for patch in land_patches.values()
+										   for neighbor in patch.neighbors])
+		self.adjacency = adjacency
+
+		patches = [land_patches[int(node)] for node in adjacency.nodes]
+
+		self._assign(adjacency,
+					 np.array([isinstance(patch, classes.Treepatch) for patch in patches], dtype=bool),
+					 np.array([patch.treestats if isinstance(patch, classes.Treepatch) else 0
+							   for patch in patches], dtype=np.int64),
+					 np.array([patch.fire is True for patch in patches], dtype=bool),
+					 rng)
+
+	@classmethod
+	def from_arrays(cls,
+					adjacency: classes.Adjacency,
+					tree: np.ndarray,
+					treestats: np.ndarray,
+					fire: np.ndarray,
+					rng: Optional[np.random.Generator] = None) -> 'PatchArrays':
+		'''
+		Create patch arrays directly from state arrays (in adjacency.nodes order),
+		without going through land patch objects.
+		'''
+		patch_arrays = cls.__new__(cls)
+		patch_arrays._assign(adjacency, tree, treestats, fire, rng)
+		return patch_arrays
+
+	def _assign(self,
+				adjacency: classes.Adjacency,
+				tree: np.ndarray,
+				treestats: np.ndarray,
+				fire: np.ndarray,
+				rng: Optional[np.random.Generator]) -> None:
+		self.adjacency = adjacency
+		self.ids = adjacency.nodes
+		self.tree = np.asarray(tree, dtype=bool)
+		self.treestats = np.asarray(treestats, dtype=np.int64)
+		self.fire = np.asarray(fire, dtype=bool)
+
+		#Directed neighbor pairs for transmission
+		self.sources = adjacency.sources()
+		self.targets = adjacency.neighbor_index
+
+		self.rng = rng if rng is not None else np.random.default_rng()
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+	def move_firefighters(self, firefighters: Dict[classes.Firefighter, int],
+						  dispatch: Optional[FirefighterDispatch] = None) -> None:
+		'''
+		Move firefighters with the rules of Firefighter.movement, or with
+		dispatch if given, reading fire flags from the arrays.
+		'''
+		if dispatch is not None:
+			dispatch.move(firefighters, self.fire)
+			return
+
+		for firefighter in firefighters.keys():
+			position = self.adjacency.index_of(firefighter.position)
+
+			#If current position is on fire, stay
+			if self.fire[position]:
+				continue
+
+			neighbors = self.adjacency.neighbors_of_index(position)
+			neighbors_on_fire = neighbors[self.fire[neighbors]]
+
+			#Move randomly to a neighbor on fire, otherwise to any neighbor
+			choices = neighbors_on_fire if len(neighbors_on_fire) else neighbors
+			firefighter.position = int(self.ids[choices[self.rng.integers(len(choices))]])
+			firefighters[firefighter] = firefighter.position
+
+	def firefighter_positions(self, firefighters: Dict[classes.Firefighter, int]) -> Tuple[np.ndarray, np.ndarray]:
+		'''
+		Return patch index and (integer) skill of each firefighter.
+
+		returns: positions, skills
+		'''
+		positions = self.adjacency.indices_of([firefighter.position for firefighter in firefighters.keys()])
+		skills = np.array([int(firefighter.skill) for firefighter in firefighters.keys()], dtype=np.int64)
+
+		return positions, skills
+
+	def sample_events(self, probability: float) -> np.ndarray:
+		'''
+		Return indices of the patches for which an event with the given
+		probability happens this tick (see sample_events).
+		'''
+		return sample_events(self.rng, len(self), probability)
+
+	def firefighter_skill(self, firefighters: Dict[classes.Firefighter, int]) -> Tuple[np.ndarray, np.ndarray]:
+		'''
+		Return which patches hold a firefighter and the combined skill
+		of the firefighters there (skills stack, as in Treepatch.updateland).
+
+		returns: guarded, skill
+		'''
+		positions, skills = self.firefighter_positions(firefighters)
+
+		guarded = np.zeros(len(self), dtype=bool)
+		guarded[positions] = True
+		skill = np.bincount(positions, weights=skills, minlength=len(self)).astype(np.int64)
+
+		return guarded, skill
+
+	def step(self, probabilities: Dict[str, float], firefighters: Dict[classes.Firefighter, int]) -> None:
+		'''
+		Advance all patches by one tick: respawn, combustion,
+		damage/healing, burnout and fire transmission.
+
+		returns: None
+		'''
+		rng = self.rng
+		guarded, skill = self.firefighter_skill(firefighters)
+
+		#Trees present at the start of the tick (respawned trees wait until next tick)
+		tree = self.tree.copy()
+
+		#Rock to tree conversions
+		respawn = self.sample_events(probabilities['respawn'])
+		respawn = respawn[~tree[respawn]]
+		self.treestats[respawn] = rng.integers(0, 257, size=len(respawn))
+		self.fire[respawn] = False
+		self.tree[respawn] = True
+
+		#Spontaneous combustion
+		ignite = self.sample_events(probabilities['combustion'])
+		ignite = ignite[tree[ignite]]
+		self.fire[ignite] = True
+		self.treestats[ignite] = 0
+
+		burning = tree & self.fire
+		damaged = burning & ~guarded
+		fought = burning & guarded
+		quiet = tree & ~self.fire & ~guarded
+
+		#If on fire and no firefighter, damage by 20 units and burn out to rock
+		self.treestats[damaged] -= 20
+		burnout = damaged & (self.treestats <= -256)
+		self.fire[burnout] = False
+		self.tree[burnout] = False
+
+		#If on fire and firefighter present, heal according to skill and put out fire
+		self.treestats[fought] += 25 + skill[fought]
+		extinguished = fought & (self.treestats >= 0)
+		self.fire[extinguished] = False
+		self.treestats[extinguished] = 256
+
+		#If no fire and no firefighter, heal by 10 units
+		self.treestats[quiet] += 10
+
+		#Fire spread from burning trees to neighboring trees
+		pairs = np.flatnonzero(self.fire[self.sources])
+		pairs = pairs[self.tree[self.targets[pairs]]]
+		caught = self.targets[pairs[rng.random(len(pairs)) < probabilities['transmission']]]
+		self.fire[caught] = True
+		self.treestats[caught] = 0
+
+	def population(self) -> Tuple[int, int, int]:
+		'''
+		Return current number of patches on fire, tree patches and rock patches.
+
+		returns: fire, tree, rock
+		'''
+		trees = int(np.count_nonzero(self.tree))
+		return int(np.count_nonzero(self.fire)), trees, len(self) - trees
+
+	def state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+		'''
+		Return copies of the state arrays (in adjacency.nodes order), e.g. for checkpoints.
+
+		returns: tree, treestats, fire
+		'''
+		return self.tree.copy(), self.treestats.copy(), self.fire.copy()
+
+	def update_color_map(self, cmap: Dict[int, int]) -> None:
+		'''
+		Update color map with the treestats of all tree patches.
+
+		Returns: None
+		'''
+		cmap.clear()
+		cmap.update(zip(self.ids[self.tree].tolist(), self.treestats[self.tree].tolist()))
+
+class FrontierPatchArrays(PatchArrays):
+	'''
+	Incremental variant of PatchArrays that only touches active patches
+	each tick: burning patches, their neighbors and patches with firefighters.
+
+	Healing of quiet tree patches (no fire, no firefighter) is deterministic,
+	+10 per tick, so it is applied lazily from the tick of their last update
+	when the patch becomes active or is read (see materialize). Population
+	counts are kept up to date as patches change.
+
+	Attributes (in addition to PatchArrays):
+		tick (int): Number of ticks advanced.
+		last_update (np.ndarray): Tick up to which the treestats of each quiet tree patch are applied.
+		burning (np.ndarray): Sorted indices of the patches on fire.
+		tree_count (int): Current number of tree patches.
+	'''
+	def _assign(self,
+				adjacency: classes.Adjacency,
+				tree: np.ndarray,
+				treestats: np.ndarray,
+				fire: np.ndarray,
+				rng: Optional[np.random.Generator]) -> None:
+		super()._assign(adjacency, tree, treestats, fire, rng)
+		self.tick = 0
+		self.last_update = np.zeros(len(self), dtype=np.int64)
+		self.burning = np.flatnonzero(self.fire)
+		self.tree_count = int(np.count_nonzero(self.tree))
+
+		#Scratch arrays for firefighter lookups, reset after each tick
+		self._guarded = np.zeros(len(self), dtype=bool)
+		self._skill = np.zeros(len(self), dtype=np.int64)
+
+	def materialize(self, indices: Optional[np.ndarray] = None, tick: Optional[int] = None) -> None:
+		'''
+		Apply pending healing of the quiet tree patches at indices (all
+		patches if None) up to and including tick (default: current tick).
+
+		returns: None
+		'''
+		if tick is None:
+			tick = self.tick
+		if indices is None:
+			indices = np.arange(len(self))
+
+		quiet = indices[self.tree[indices] & ~self.fire[indices]]
+		self.treestats[quiet] += 10 * (tick - self.last_update[quiet])
+		self.last_update[indices] = tick
+
+	def step(self, probabilities: Dict[str, float], firefighters: Dict[classes.Firefighter, int]) -> None:
+		'''
+		Advance active patches by one tick with the same rules as PatchArrays.step.
+
+		returns: None
+		'''
+		rng = self.rng
+		tick = self.tick + 1
+
+		#Firefighter positions and combined skill per position
+		positions, skills = self.firefighter_positions(firefighters)
+		guard, inverse = np.unique(positions, return_inverse=True)
+		self._guarded[guard] = True
+		self._skill[guard] = np.bincount(inverse, weights=skills, minlength=len(guard)).astype(np.int64)
+
+		#Rock to tree conversions and spontaneous combustion, drawn from the start-of-tick state
+		respawn = self.sample_events(probabilities['respawn'])
+		respawn = respawn[~self.tree[respawn]]
+		ignite = self.sample_events(probabilities['combustion'])
+		ignite = ignite[self.tree[ignite]]
+
+		self.tree[respawn] = True
+		self.treestats[respawn] = rng.integers(0, 257, size=len(respawn))
+		self.last_update[respawn] = tick
+
+		self.fire[ignite] = True
+		self.treestats[ignite] = 0
+		self.last_update[ignite] = tick
+		burning = np.union1d(self.burning, ignite)
+
+		#Quiet trees with a firefighter are brought up to date but do not heal this tick
+		quiet_guard = guard[self.tree[guard] & ~self.fire[guard] & (self.last_update[guard] < tick)]
+		self.materialize(quiet_guard, tick - 1)
+		self.last_update[quiet_guard] = tick
+
+		guarded = self._guarded[burning]
+		damaged = burning[~guarded]
+		fought = burning[guarded]
+
+		#If on fire and no firefighter, damage by 20 units and burn out to rock
+		self.treestats[damaged] -= 20
+		burnout = damaged[self.treestats[damaged] <= -256]
+		self.fire[burnout] = False
+		self.tree[burnout] = False
+
+		#If on fire and firefighter present, heal according to skill and put out fire
+		self.treestats[fought] += 25 + self._skill[fought]
+		extinguished = fought[self.treestats[fought] >= 0]
+		self.fire[extinguished] = False
+		self.treestats[extinguished] = 256
+		self.last_update[extinguished] = tick
+
+		self._guarded[guard] = False
+		self._skill[guard] = 0
+
+		#Fire spread from burning trees to neighboring trees
+		burning = burning[self.fire[burning]]
+		_, targets = self.adjacency.neighbor_pairs(burning)
+		targets = targets[self.tree[targets]]
+		caught = np.unique(targets[rng.random(len(targets)) < probabilities['transmission']])
+		self.fire[caught] = True
+		self.treestats[caught] = 0
+		self.last_update[caught] = tick
+
+		self.burning = np.union1d(burning, caught)
+		self.tree_count += len(respawn) - len(burnout)
+		self.tick = tick
+
+	def population(self) -> Tuple[int, int, int]:
+		'''
+		Return current number of patches on fire, tree patches and rock patches.
+
+		returns: fire, tree, rock
+		'''
+		return len(self.burning), self.tree_count, len(self) - self.tree_count
+
+	def state(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+		'''
+		Apply pending healing and return copies of the state arrays.
+
+		returns: tree, treestats, fire
+		'''
+		self.materialize()
+		return super().state()
+
+	def update_color_map(self, cmap: Dict[int, int]) -> None:
+		'''
+		Apply pending healing and update color map with the treestats of all tree patches.
+
+		Returns: None
+		'''
+		self.materialize()
+		super().update_color_map(cmap)
+
+def update_patches(tree: np.ndarray,
+				   treestats: np.ndarray,
+				   fire: np.ndarray,
+				   guarded: np.ndarray,
+				   skill: np.ndarray,
+				   probabilities: Dict[str, float],
+				   rng: np.random.Generator) -> None:
+	'''
+	Advance patch state arrays (modified in place) by one tick except for
+	fire transmission, with the rules of PatchArrays.step: respawn,
+	combustion, damage/healing and burnout. Guarded and skill tell which
+	patches hold firefighters and their combined skill.
+
+	returns: None
+	'''
+	#Trees present at the start of the tick (respawned trees wait until next tick)
+	start_tree = tree.copy()
+
+	#Rock to tree conversions
+	respawn = sample_events(rng, len(tree), probabilities['respawn'])
+	respawn = respawn[~start_tree[respawn]]
+	treestats[respawn] = rng.integers(0, 257, size=len(respawn))
+	fire[respawn] = False
+	tree[respawn] = True
+
+	#Spontaneous combustion
+	ignite = sample_events(rng, len(tree), probabilities['combustion'])
+	ignite = ignite[start_tree[ignite]]
+	fire[ignite] = True
+	treestats[ignite] = 0
+
+	burning = start_tree & fire
+	damaged = burning & ~guarded
+	fought = burning & guarded
+	quiet = start_tree & ~fire & ~guarded
+
+	#Damage by 20 units if on fire and no firefighter, heal according to
+	#skill if on fire and firefighters present, heal by 10 units if neither
+	#(arithmetic on whole arrays is faster than masked updates at this size)
+	treestats += 10*quiet - 20*damaged + fought*(25 + skill)
+
+	#Burn out to rock, or put out fire
+	burnout = damaged & (treestats <= -256)
+	extinguished = fought & (treestats >= 0)
+	fire &= ~(burnout | extinguished)
+	tree &= ~burnout
+	np.copyto(treestats, 256, where=extinguished)
+
+class ReplicaPatchArrays:
+	'''
+	Independent replicas of the simulation on one graph, stored as
+	(replicas × patches) arrays and advanced together, so a tick of all
+	replicas is a few array operations instead of one PatchArrays step per
+	replica. Every replica has its own landscape and firefighters, and
+	follows the rules of PatchArrays.step.
+
+	Attributes:
+		adjacency (classes.Adjacency): Graph adjacency shared by all replicas.
+		ids (np.ndarray): Patch id of each column.
+		tree (np.ndarray): Whether each patch of each replica is a tree patch (replicas × patches).
+		treestats (np.ndarray): Tree health (replicas × patches).
+		fire (np.ndarray): Whether each patch of each replica is on fire (replicas × patches).
+		positions (np.ndarray): Patch index of each firefighter (replicas × firefighters).
+		skills (np.ndarray): Integer skill of each firefighter (replicas × firefighters).
+		rng (np.random.Generator): Random number generator of all replicas.
+	'''
+	def __init__(self,
+				 adjacency: classes.Adjacency,
+				 tree: np.ndarray,
+				 treestats: np.ndarray,
+				 fire: np.ndarray,
+				 positions: np.ndarray,
+				 skills: np.ndarray,
+				 rng: Optional[np.random.Generator] = None) -> None:
+		self.adjacency = adjacency
+		self.ids = adjacency.nodes
+		self.tree = np.ascontiguousarray(tree, dtype=bool)
+		self.treestats = np.ascontiguousarray(treestats, dtype=np.int64)
+		self.fire = np.ascontiguousarray(fire, dtype=bool)
+		self.positions = np.ascontiguousarray(positions, dtype=np.int64)
+		self.skills = np.ascontiguousarray(skills, dtype=np.int64)
+		self.rng = rng if rng is not None else np.random.default_rng()
+
+	@property
+	def replicas(self) -> int:
+		return self.tree.shape[0]
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+	def flat_positions(self) -> np.ndarray:
+		'''
+		Return firefighter positions as indices into the flattened state arrays.
+		'''
+		return self.positions + np.arange(self.replicas, dtype=np.int64)[:, None]*len(self)
+
+	def move_firefighters(self, dispatch: Optional[FirefighterDispatch] = None) -> None:
+		'''
+		Move the firefighters of all replicas with the rules of
+		Firefighter.movement, or with dispatch if given.
+		'''
+		positions = self.flat_positions().reshape(-1)
+		if dispatch is not None:
+			positions = dispatch.destinations(positions, self.fire)
+		else:
+			positions = neighbor_destinations(self.adjacency, positions, self.fire, self.rng)
+		self.positions = positions.reshape(self.positions.shape) % len(self)
+
+	def step(self, probabilities: Dict[str, float]) -> None:
+		'''
+		Advance all patches of all replicas by one tick: respawn,
+		combustion, damage/healing, burnout and fire transmission.
+
+		returns: None
+		'''
+		rng = self.rng
+
+		#Flat views of the state, so replicas are handled like one large graph
+		tree, treestats, fire = self.tree.reshape(-1), self.treestats.reshape(-1), self.fire.reshape(-1)
+		positions = self.flat_positions().reshape(-1)
+		guarded = np.zeros(len(tree), dtype=bool)
+		guarded[positions] = True
+		skill = np.bincount(positions, weights=self.skills.reshape(-1), minlength=len(tree)).astype(np.int64)
+
+		update_patches(tree, treestats, fire, guarded, skill, probabilities, rng)
+
+		#Fire spread from burning trees to neighboring trees of the same replica
+		_, targets = neighbor_pairs(self.adjacency, np.flatnonzero(fire))
+		targets = targets[tree[targets]]
+		caught = targets[rng.random(len(targets)) < probabilities['transmission']]
+		fire[caught] = True
+		treestats[caught] = 0
+
+	def population(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+		'''
+		Return current number of patches on fire, tree patches and rock patches of each replica.
+
+		returns: fire, tree, rock (arrays of length replicas)
+		'''
+		trees = np.count_nonzero(self.tree, axis=1)
+		return np.count_nonzero(self.fire, axis=1), trees, len(self) - trees
+
+def create_patch_arrays(adjacency: classes.Adjacency, fraction_tree: float,
+						rng: np.random.Generator) -> PatchArrays:
+	'''
+	Create random initial landscape as arrays, with the same distribution
+	as module_configuration.create_color_map and create_land_patches.
+
+	returns: PatchArrays
+	'''
+	number_of_nodes = len(adjacency)
+	trees = rng.choice(number_of_nodes, int(fraction_tree*number_of_nodes), replace=False)
+
+	tree = np.zeros(number_of_nodes, dtype=bool)
+	tree[trees] = True
+	treestats = np.zeros(number_of_nodes, dtype=np.int64)
+	treestats[trees] = rng.integers(0, 257, size=len(trees))
+
+	return PatchArrays.from_arrays(adjacency, tree, treestats, np.zeros(number_of_nodes, dtype=bool), rng)
+
+def create_firefighters(adjacency: classes.Adjacency, firefighter_number: int, firefighter_skill: float,
+						rng: np.random.Generator) -> Dict[classes.Firefighter, int]:
+	'''
+	Create firefighters with random starting position and skill, with the
+	same distribution as module_configuration.create_firefighters.
+
+	returns: Dictionary of firefighters (objects of class Firefighter)
+	'''
+	positions = adjacency.nodes[rng.choice(len(adjacency), firefighter_number, replace=False)].tolist()
+	skills = rng.normal(firefighter_skill, 2.0, size=firefighter_number).tolist()
+
+	return {classes.Firefighter(skill=skill, position=position): position
+			for skill, position in zip(skills, positions)}
+
+def create_replica_arrays(adjacency: classes.Adjacency, replicas: int, fraction_tree: float, firefighter_number: int,
+						  firefighter_skill: float, rng: np.random.Generator) -> ReplicaPatchArrays:
+	'''
+	Create independent random landscapes and firefighters for replicas, each
+	with the distribution of create_patch_arrays and create_firefighters.
+
+	returns: ReplicaPatchArrays
+	'''
+	number_of_nodes = len(adjacency)
+	replica_rows = np.arange(replicas)[:, None]
+
+	#Random subset of tree patches per replica: the patches with the lowest random keys
+	trees = np.argsort(rng.random((replicas, number_of_nodes)), axis=1)[:, :int(fraction_tree*number_of_nodes)]
+	tree = np.zeros((replicas, number_of_nodes), dtype=bool)
+	tree[replica_rows, trees] = True
+	treestats = np.zeros((replicas, number_of_nodes), dtype=np.int64)
+	treestats[replica_rows, trees] = rng.integers(0, 257, size=trees.shape)
+
+	positions = np.argsort(rng.random((replicas, number_of_nodes)), axis=1)[:, :firefighter_number]
+	skills = np.trunc(rng.normal(firefighter_skill, 2.0, size=positions.shape)).astype(np.int64)
+
+	return ReplicaPatchArrays(adjacency, tree, treestats, np.zeros((replicas, number_of_nodes), dtype=bool),
+							  positions, skills, rng)
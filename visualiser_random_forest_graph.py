@@ -20,26 +20,35 @@ This module provided as material for the phase 2 project for DM857, DS830 (2023)
 """
 
 from __future__ import annotations # to use a class in type hints of its members
+import time
 from typing import List, Optional, Dict
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
 
 class Visualiser:
   """Each instance of this class maintains a window where it displays the status of a given collection of edges and sites forming the graph of a simulation."""
   colour_map={0:plt.cm.Greens,1:plt.cm.Reds}
   no_colour=plt.cm.Greys(100)
+  # RGBA colour of every value from -256 to 256 (index value+256), same colours as colour_map
+  colour_lut=np.concatenate([colour_map[1](np.arange(256,-1,-1)),colour_map[0](np.arange(1,257))])
   def __init__(self:Visualiser, 
                edges:List[(int,int)],
                Colour_map: Optional[Dict[int:(int,int)]]={},
                pos_nodes: Optional[Dict[int:Tuple[float,float]]]={},
                node_size : Optional[int] = 100,
                vis_labels: Optional[bool] = False,
-               window_title : Optional[str]=None)->None:
+               window_title : Optional[str]=None,
+               reuse_artists: Optional[bool] = False,
+               pause: Optional[float] = 0.1,
+               fps: Optional[float] = None,
+               layout: Optional[str] = 'auto')->None:
     """
     Parameters
     ----------
     edges: List[(int,int)]
-      List containing the edges (Tuples of 2 vertices) forming the 2D surface for the simulation.
+      List containing the edges (Tuples of 2 vertices) forming the 2D surface for the simulation,
+      or an array of shape (edges, 2) such as the edges of a binary graph file
     Colour_map: Dict[int:int]
       Dictionary containing the identity and color of each node
         Colour, expressed as a integer from -256(full-red) to 256(full-green)
@@ -49,18 +58,34 @@ class Visualiser:
       switch to visualize/hide the labels (used to track the species)
     window_title : Optional[str], default = None
       The title of the window.
+    reuse_artists: Optional[bool] = False
+      create node, edge and label collections once and only update their colours and
+      offsets on each frame, instead of clearing and redrawing the whole figure
+    pause: Optional[float], default 0.1
+      seconds to pause after every frame; 0 or None renders unthrottled
+    fps: Optional[float], default None
+      if given, frames are paced to at most this rate (pausing only for the time left
+      of each frame) and pause is ignored
+    layout: Optional[str], default 'auto'
+      layout used if pos_nodes is not given, one of module_layout.LAYOUTS ('auto' is the
+      spring layout for small graphs and a pivot MDS layout for large ones); layouts are
+      cached on disk, so reopening the same graph is instant
     """
+    if isinstance(edges,np.ndarray):
+      edges = [tuple(edge) for edge in edges.tolist()]
     self._edges = edges
     self._vis_labels = vis_labels
     self._H = nx.Graph(self._edges)  # create a Graph dict mapping nodes to nbrs
-    self._cmap = [self.no_colour]*self._H.number_of_nodes()
+    self._node_index = {node:i for i,node in enumerate(self._H.nodes())}
+    self._cmap = np.tile(self.no_colour,(self._H.number_of_nodes(),1))
     self._lnodes_edges =[]
     self._window_title=window_title
-    for key,val in Colour_map.items():
-      if(val>0):
-        self._cmap[list(self._H.nodes()).index(key)] = self.colour_map[0](val)
-      else:
-        self._cmap[list(self._H.nodes()).index(key)] = self.colour_map[1](-val)
+    self._reuse_artists = reuse_artists
+    self._artists = None
+    self._pause = pause
+    self._fps = fps
+    self._last_frame = time.perf_counter()
+    self._set_colours(Colour_map)
 
     self._node_size = node_size
     # Need to create a layout when doing
@@ -68,9 +93,11 @@ class Visualiser:
     if(pos_nodes):
       self._pos = pos_nodes
     else:
-      self._pos = nx.spring_layout(self._H,k=2)
+      import module_layout
+      self._pos = module_layout.cached_layout(self._edges,layout)
+    self._pos_array = np.array([self._pos[node] for node in self._H.nodes()],dtype=float).reshape(-1,2)
 
-    self._fig, ax = plt.subplots()
+    self._fig, self._ax = plt.subplots()
     # title
     if(self._window_title):
       self._fig.canvas.manager.set_window_title(self._window_title)    
@@ -99,12 +126,26 @@ class Visualiser:
   def update_node_colours(self:Visualiser,Colour_map:Dict[int:int]) -> None:
     """Informs this visualiser that the status of its colours has been updated."""
     if self.is_open() :
-      self._cmap = [self.no_colour]*self._H.number_of_nodes()
-      for key,val in Colour_map.items():
-        if(val>0):
-          self._cmap[list(self._H.nodes()).index(key)] = self.colour_map[0](val)
-        else:
-          self._cmap[list(self._H.nodes()).index(key)] = self.colour_map[1](-val)
+      self._set_colours(Colour_map)
+    self._replot()
+
+  def _set_colours(self:Visualiser,Colour_map:Dict[int:int]) -> None:
+    '''Look up the colour of each node in colour_lut'''
+    self._cmap[:] = self.no_colour
+    if(Colour_map):
+      index = np.fromiter((self._node_index[key] for key in Colour_map.keys()),dtype=np.int64,count=len(Colour_map))
+      values = np.fromiter(Colour_map.values(),dtype=np.int64,count=len(Colour_map))
+      self._cmap[index] = self.colour_lut[np.clip(values,-256,256)+256]
+
+  def frame(self:Visualiser) -> np.ndarray:
+    """Returns the current content of the window as an RGBA image array (requires an Agg based canvas)."""
+    return np.array(self._fig.canvas.buffer_rgba())
+
+  def update(self:Visualiser,Colour_map:Dict[int:int],lab_map:List[int]) -> None:
+    """Informs this visualiser that both its colours and labels have been updated, drawing a single frame."""
+    if self.is_open() :
+      self._set_colours(Colour_map)
+    self._lnodes_edges=lab_map
     self._replot()
 
   def update_node_edges(self:Visualiser,lab_map:List[int]) -> None:
@@ -114,18 +155,70 @@ class Visualiser:
 
   def _replot(self:Visualiser) -> None:
     '''Plotting facility'''
-    plt.clf()
-    nx.draw_networkx_nodes(self._H, self._pos,
-                       node_color = self._cmap, node_size = self._node_size,linewidths=1)
-    nx.draw_networkx_edges(self._H, self._pos, arrows=False)
-    if(self._lnodes_edges):
-       lcmap=[self._cmap[i] for i in self._lnodes_edges]
-       nx.draw_networkx_nodes(self._H,self._pos,node_color = lcmap,
-                              nodelist=self._lnodes_edges, node_size = self._node_size, edgecolors="blue",linewidths=2)
-    self._fig.canvas.draw()
+    if(self._reuse_artists):
+      self._update_artists()
+    else:
+      plt.clf()
+      nx.draw_networkx_nodes(self._H, self._pos,
+                         node_color = self._cmap, node_size = self._node_size,linewidths=1)
+      nx.draw_networkx_edges(self._H, self._pos, arrows=False)
+      if(self._lnodes_edges):
+         lcmap=[self._cmap[self._node_index[i]] for i in self._lnodes_edges]
+         nx.draw_networkx_nodes(self._H,self._pos,node_color = lcmap,
+                                nodelist=self._lnodes_edges, node_size = self._node_size, edgecolors="blue",linewidths=2)
+      self._fig.canvas.draw()
     self._fig.canvas.flush_events()
     plt.show(block=False)
     #plt.savefig('generic_graph_1.pdf')  
-    plt.pause(0.1)
-
-  
\ No newline at end of file
+    self._wait()
+
+  def _wait(self:Visualiser) -> None:
+    '''Pause between frames according to fps or pause'''
+    if(self._fps):
+      remaining = self._last_frame + 1.0/self._fps - time.perf_counter()
+      if(remaining > 0):
+        plt.pause(remaining)
+      self._last_frame = time.perf_counter()
+    elif(self._pause):
+      plt.pause(self._pause)
+
+  def _update_artists(self:Visualiser) -> None:
+    '''
+    Create node, edge and label collections on first use, afterwards only update their colours and offsets.
+    Where the canvas supports blitting, the edges are cached as background and only nodes and labels are redrawn.
+    '''
+    canvas = self._fig.canvas
+    if(self._artists is None):
+      nodes = nx.draw_networkx_nodes(self._H, self._pos, ax=self._ax,
+                                     node_color = self._cmap, node_size = self._node_size,linewidths=1)
+      edges = nx.draw_networkx_edges(self._H, self._pos, ax=self._ax, arrows=False)
+      labels = self._ax.scatter(np.empty(0), np.empty(0), s = self._node_size, edgecolors="blue",linewidths=2,zorder=3)
+      self._artists = (nodes, edges, labels)
+      self._background = None
+      if(canvas.supports_blit):
+        nodes.set_animated(True)
+        labels.set_animated(True)
+        # (re)cache background whenever the whole figure is drawn, e.g. after resizing
+        def on_draw(_)->None:
+          self._background = canvas.copy_from_bbox(self._fig.bbox)
+          self._draw_animated()
+        canvas.mpl_connect('draw_event', on_draw)
+    nodes, _, labels = self._artists
+    nodes.set_facecolor(self._cmap)
+    index = np.fromiter((self._node_index[i] for i in self._lnodes_edges),dtype=np.int64,count=len(self._lnodes_edges))
+    labels.set_offsets(self._pos_array[index])
+    labels.set_facecolor(self._cmap[index])
+    if(not canvas.supports_blit):
+      canvas.draw()
+    elif(self._background is None):
+      canvas.draw()
+    else:
+      canvas.restore_region(self._background)
+      self._draw_animated()
+
+  def _draw_animated(self:Visualiser) -> None:
+    '''Draw nodes and labels over the cached background'''
+    nodes, _, labels = self._artists
+    self._ax.draw_artist(nodes)
+    self._ax.draw_artist(labels)
+    self._fig.canvas.blit(self._fig.bbox)